@@ -0,0 +1,311 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import bisect
+from array import array
+
+# 每個容器涵蓋 2^16 個整數，以整數的高 16 位元為鍵值
+CONTAINER_BITS = 16
+CONTAINER_SIZE = 1 << CONTAINER_BITS
+LOW_MASK = CONTAINER_SIZE - 1
+
+# 容器種類
+ARRAY = 0   # 排序的 array('H')，適合稀疏的集合
+BITMAP = 1  # 65536 位元的整數，位元運算由 Python 整數以機器字組為單位進行
+RUN = 2     # array('H') 依序存放 [起點, 長度-1, ...]，適合連續的範圍
+
+# 陣列容器的最大筆數，超過時點陣圖容器較省空間
+ARRAY_MAX = 4096
+BITMAP_BYTES = CONTAINER_SIZE // 8
+
+# 位元組中被設定的位元位置
+_BYTE_BITS = [tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256)]
+
+if hasattr(int, 'bit_count'):
+    def _popcount(value):
+        return value.bit_count()
+else:
+    def _popcount(value):
+        return bin(value).count('1')
+
+
+def _bits(value):
+    """依序產生整數中被設定的位元位置"""
+    data = value.to_bytes(BITMAP_BYTES, 'little')
+    for index, byte in enumerate(data):
+        if byte:
+            base = index << 3
+            for bit in _BYTE_BITS[byte]:
+                yield base + bit
+
+
+def _to_int(kind, data):
+    """將容器轉換為點陣圖整數"""
+    if kind == BITMAP:
+        return data
+    if kind == RUN:
+        value = 0
+        for i in range(0, len(data), 2):
+            value |= ((1 << (data[i + 1] + 1)) - 1) << data[i]
+        return value
+    buffer = bytearray(BITMAP_BYTES)
+    for low in data:
+        buffer[low >> 3] |= 1 << (low & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def _from_int(value):
+    """由點陣圖整數建立最省空間的容器，空集合返回 None"""
+    if not value:
+        return None
+    cardinality = _popcount(value)
+    starts = value & ~(value << 1)
+    run_count = _popcount(starts)
+    run_bytes = run_count * 4
+    if run_bytes < min(cardinality * 2, BITMAP_BYTES):
+        ends = value & ~(value >> 1)
+        runs = array('H')
+        for start, end in zip(_bits(starts), _bits(ends)):
+            runs.append(start)
+            runs.append(end - start)
+        return RUN, runs
+    if cardinality <= ARRAY_MAX:
+        return ARRAY, array('H', _bits(value))
+    return BITMAP, value
+
+
+def _cardinality(kind, data):
+    if kind == ARRAY:
+        return len(data)
+    if kind == BITMAP:
+        return _popcount(data)
+    return sum(data[i + 1] + 1 for i in range(0, len(data), 2))
+
+
+def _iter_container(kind, data):
+    if kind == ARRAY:
+        return iter(data)
+    if kind == BITMAP:
+        return _bits(data)
+    return (low for i in range(0, len(data), 2) for low in range(data[i], data[i] + data[i + 1] + 1))
+
+
+def _contains(kind, data, low):
+    if kind == ARRAY:
+        index = _bisect(data, low)
+        return index < len(data) and data[index] == low
+    if kind == BITMAP:
+        return bool(data >> low & 1)
+    for i in range(0, len(data), 2):
+        if data[i] <= low <= data[i] + data[i + 1]:
+            return True
+    return False
+
+
+def _bisect(data, low):
+    lo, hi = 0, len(data)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if data[mid] < low:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+class RoaringBitmap:
+    """以 Roaring 結構壓縮的整數集合
+
+    整數依高 16 位元分組，每組依密度存成陣列、點陣圖或連續範圍容器，
+    交集、聯集與差集以容器為單位進行。
+    """
+
+    __slots__ = ('containers',)
+
+    def __init__(self, values=None):
+        self.containers = {}  # 高 16 位元 -> (容器種類, 資料)
+        if values is not None:
+            # 排序後依高 16 位元切段，低位元以 map 在 C 層取出
+            values = sorted(set(values))
+            start = 0
+            while start < len(values):
+                high = values[start] >> CONTAINER_BITS
+                end = bisect.bisect_left(values, (high + 1) << CONTAINER_BITS, start)
+                lows = array('H', map(LOW_MASK.__and__, values[start:end]))
+                if len(lows) <= ARRAY_MAX:
+                    self.containers[high] = (ARRAY, lows)
+                else:
+                    self.containers[high] = _from_int(_to_int(ARRAY, lows))
+                start = end
+
+    @classmethod
+    def _from_containers(cls, containers):
+        bitmap = cls()
+        bitmap.containers = containers
+        return bitmap
+
+    def copy(self):
+        return self._from_containers({
+            high: (kind, data if kind == BITMAP else array('H', data))
+            for high, (kind, data) in self.containers.items()
+        })
+
+    def __len__(self):
+        return sum(_cardinality(kind, data) for kind, data in self.containers.values())
+
+    def __bool__(self):
+        return bool(self.containers)
+
+    def __iter__(self):
+        for high in sorted(self.containers):
+            base = high << CONTAINER_BITS
+            kind, data = self.containers[high]
+            for low in _iter_container(kind, data):
+                yield base | low
+
+    def __contains__(self, value):
+        container = self.containers.get(value >> CONTAINER_BITS)
+        if container is None:
+            return False
+        return _contains(container[0], container[1], value & LOW_MASK)
+
+    def __eq__(self, other):
+        if not isinstance(other, RoaringBitmap):
+            return NotImplemented
+        if self.containers.keys() != other.containers.keys():
+            return False
+        return all(_to_int(*self.containers[high]) == _to_int(*other.containers[high])
+                   for high in self.containers)
+
+    def add(self, value):
+        high = value >> CONTAINER_BITS
+        low = value & LOW_MASK
+        container = self.containers.get(high)
+        if container is None:
+            self.containers[high] = (ARRAY, array('H', [low]))
+            return
+        kind, data = container
+        if kind == ARRAY:
+            index = _bisect(data, low)
+            if index < len(data) and data[index] == low:
+                return
+            if len(data) < ARRAY_MAX:
+                data.insert(index, low)
+                return
+        self.containers[high] = _from_int(_to_int(kind, data) | (1 << low))
+
+    def discard(self, value):
+        high = value >> CONTAINER_BITS
+        low = value & LOW_MASK
+        container = self.containers.get(high)
+        if container is None:
+            return
+        kind, data = container
+        if kind == ARRAY:
+            index = _bisect(data, low)
+            if index < len(data) and data[index] == low:
+                del data[index]
+                if not data:
+                    del self.containers[high]
+            return
+        container = _from_int(_to_int(kind, data) & ~(1 << low))
+        if container is None:
+            del self.containers[high]
+        else:
+            self.containers[high] = container
+
+    def __and__(self, other):
+        containers = {}
+        if len(other.containers) < len(self.containers):
+            self, other = other, self
+        for high, (kind, data) in self.containers.items():
+            other_container = other.containers.get(high)
+            if other_container is None:
+                continue
+            other_kind, other_data = other_container
+            if kind == ARRAY and other_kind == ARRAY:
+                lows = set(data).intersection(other_data)
+                if lows:
+                    containers[high] = (ARRAY, array('H', sorted(lows)))
+            elif kind == ARRAY:
+                lows = array('H', (low for low in data if _contains(other_kind, other_data, low)))
+                if lows:
+                    containers[high] = (ARRAY, lows)
+            elif other_kind == ARRAY:
+                lows = array('H', (low for low in other_data if _contains(kind, data, low)))
+                if lows:
+                    containers[high] = (ARRAY, lows)
+            else:
+                container = _from_int(_to_int(kind, data) & _to_int(other_kind, other_data))
+                if container is not None:
+                    containers[high] = container
+        return self._from_containers(containers)
+
+    def __or__(self, other):
+        containers = {}
+        for high in self.containers.keys() | other.containers.keys():
+            left = self.containers.get(high)
+            right = other.containers.get(high)
+            if left is None or right is None:
+                kind, data = left or right
+                containers[high] = (kind, data if kind == BITMAP else array('H', data))
+            elif left[0] == ARRAY and right[0] == ARRAY and len(left[1]) + len(right[1]) <= ARRAY_MAX:
+                containers[high] = (ARRAY, array('H', sorted(set(left[1]).union(right[1]))))
+            else:
+                containers[high] = _from_int(_to_int(*left) | _to_int(*right))
+        return self._from_containers(containers)
+
+    def __sub__(self, other):
+        containers = {}
+        for high, (kind, data) in self.containers.items():
+            other_container = other.containers.get(high)
+            if other_container is None:
+                containers[high] = (kind, data if kind == BITMAP else array('H', data))
+            elif kind == ARRAY and other_container[0] == ARRAY:
+                lows = array('H', sorted(set(data).difference(other_container[1])))
+                if lows:
+                    containers[high] = (ARRAY, lows)
+            elif kind == ARRAY:
+                other_kind, other_data = other_container
+                lows = array('H', (low for low in data if not _contains(other_kind, other_data, low)))
+                if lows:
+                    containers[high] = (ARRAY, lows)
+            else:
+                container = _from_int(_to_int(kind, data) & ~_to_int(*other_container))
+                if container is not None:
+                    containers[high] = container
+        return self._from_containers(containers)
+
+    @staticmethod
+    def intersect_many(bitmaps):
+        """多個集合的交集，由最小的集合開始計算"""
+        bitmaps = sorted(bitmaps, key=len)
+        if not bitmaps:
+            return RoaringBitmap()
+        result = bitmaps[0]
+        for bitmap in bitmaps[1:]:
+            result = result & bitmap
+            if not result:
+                break
+        return result
+
+    @staticmethod
+    def union_many(bitmaps):
+        """多個集合的聯集，以點陣圖整數逐一合併每個容器"""
+        merged = {}
+        for bitmap in bitmaps:
+            for high, container in bitmap.containers.items():
+                merged[high] = merged.get(high, 0) | _to_int(*container)
+        containers = {}
+        for high, value in merged.items():
+            container = _from_int(value)
+            if container is not None:
+                containers[high] = container
+        return RoaringBitmap._from_containers(containers)
+
+    def nbytes(self):
+        """估計容器資料佔用的位元組數"""
+        total = 0
+        for kind, data in self.containers.values():
+            total += BITMAP_BYTES if kind == BITMAP else len(data) * 2
+        return total
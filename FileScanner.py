@@ -0,0 +1,420 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+logger = logging.getLogger('TagArtisan')
+
+# 快照格式版本，格式或檔案標識算法改變時需遞增
+SNAPSHOT_VERSION = 2
+
+# 檔案標識緩存格式版本
+FINGERPRINT_CACHE_VERSION = 1
+
+# 檔案標識緩存的最大筆數，超過時淘汰最久未使用的紀錄
+FINGERPRINT_CACHE_SIZE = 200000
+
+# 並行計算檔案標識的預設執行緒數；讀取時間主要花在等待磁碟或網路，因此可多於 CPU 核心數
+DEFAULT_HASH_WORKERS = 8
+
+
+def file_identity(info):
+    """由快照中的檔案狀態取得檔案身分 (裝置, inode/檔案ID, 大小, 修改時間)
+
+    無法取得 inode/檔案ID 的檔案系統返回 None。
+    """
+    if len(info) < 5 or not info[4]:
+        return None
+    return (info[3], info[4], info[0], info[1])
+
+
+def full_stat(file_path, stat):
+    """補齊檔案狀態中的 inode 與裝置
+
+    Windows 上 DirEntry.stat() 不含 inode 與裝置，需另外呼叫 os.stat()。
+    """
+    if not stat.st_ino:
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            pass
+    return stat
+
+
+def stat_info(file_path, stat, file_hash=None):
+    """建立快照中的檔案狀態 [大小, 修改時間(ns), 檔案標識, 裝置, inode/檔案ID]"""
+    stat = full_stat(file_path, stat)
+    return [stat.st_size, stat.st_mtime_ns, file_hash, stat.st_dev, stat.st_ino]
+
+
+def fingerprint_files(jobs, fingerprint, workers=DEFAULT_HASH_WORKERS, queue_size=None):
+    """以執行緒池並行計算檔案標識
+
+    jobs 為前兩項是 (完整路徑, 檔案狀態) 的工作（可為產生器），依完成順序產生 (工作, 檔案標識)。
+    同時排隊中的工作數以 queue_size 為上限（預設為執行緒數的 4 倍），
+    合併結果由呼叫端單一執行緒處理，因此不需為資料庫加鎖。
+    """
+    if workers <= 1:
+        for job in jobs:
+            yield job, fingerprint(job[0], job[1])
+        return
+
+    queue_size = queue_size or workers * 4
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='fingerprint') as executor:
+        pending = {}
+        for job in jobs:
+            pending[executor.submit(fingerprint, job[0], job[1])] = job
+            if len(pending) >= queue_size:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future.result()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future.result()
+
+
+class ScanResult:
+    """一次增量掃描的結果"""
+
+    def __init__(self):
+        self.unchanged = []  # (完整路徑, 檔案名稱, 快照中的檔案標識)
+        self.changed = []    # (完整路徑, 檔案名稱, 快照檔案狀態, os.stat_result)，新增或狀態改變的檔案
+        self.removed = []    # (完整路徑, 檔案狀態)，已不存在的檔案
+
+
+class DirectorySnapshot:
+    """資料夾快照：記錄每個資料夾的修改時間與子項目狀態，供增量掃描使用
+
+    每個資料夾的紀錄格式為
+    {"mtime": 修改時間(ns), "files": {名稱: [大小, 修改時間(ns), 檔案標識, 裝置, inode]}, "dirs": [子資料夾名稱]}
+    fingerprint 為檔案標識策略代碼，策略改變時舊快照中的檔案標識不再使用。
+    """
+
+    def __init__(self, snapshot_file, fingerprint=''):
+        self.snapshot_file = snapshot_file
+        self.fingerprint = fingerprint
+        self.dirs = {}
+        self.modified = False
+
+    def load(self):
+        """從磁碟載入快照，格式不符時視為空快照"""
+        self.dirs = {}
+        self.modified = False
+        if not os.path.exists(self.snapshot_file):
+            return
+        try:
+            with open(self.snapshot_file, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            if (isinstance(data, dict) and data.get('version') == SNAPSHOT_VERSION
+                    and data.get('fingerprint') == self.fingerprint):
+                self.dirs = data.get('dirs', {})
+        except Exception as e:
+            logger.error(f"載入資料夾快照時出錯: {str(e)}")
+            self.dirs = {}
+
+    def save(self):
+        """將快照寫回磁碟（僅在內容有變動時）
+
+        可在掃描或套用監控事件的同時由背景執行緒呼叫：先複製各資料夾的檔案表再寫入，
+        複製之後的變動會重新標記 modified，由下一次儲存寫入。
+        """
+        if not self.modified:
+            return
+        self.modified = False
+        # list() 與 dict() 一次複製，不受其他執行緒同時新增或刪除項目影響
+        dirs = {dir_path: {"mtime": entry["mtime"], "files": dict(entry["files"]), "dirs": list(entry["dirs"])}
+                for dir_path, entry in list(self.dirs.items())}
+        data = {
+            'version': SNAPSHOT_VERSION,
+            'fingerprint': self.fingerprint,
+            'dirs': dirs
+        }
+        temp_file = self.snapshot_file + '.tmp'
+        try:
+            with open(temp_file, 'w', encoding='utf-8') as file:
+                json.dump(data, file, ensure_ascii=False, separators=(',', ':'))
+            os.replace(temp_file, self.snapshot_file)
+        except Exception as e:
+            self.modified = True
+            logger.error(f"儲存資料夾快照時出錯: {str(e)}")
+
+    def clear(self):
+        """清空快照，下次掃描將視所有檔案為新檔案"""
+        self.dirs = {}
+        self.modified = True
+
+    def set_hash(self, file_path, file_hash):
+        """記錄檔案的檔案標識"""
+        dir_path, name = os.path.split(file_path)
+        entry = self.dirs.get(dir_path)
+        if entry is None:
+            return
+        info = entry["files"].get(name)
+        if info is not None and info[2] != file_hash:
+            info[2] = file_hash
+            self.modified = True
+
+    def update_file(self, file_path, stat, file_hash):
+        """記錄單一檔案的最新狀態（資料夾不在快照中時忽略）"""
+        dir_path, name = os.path.split(file_path)
+        entry = self.dirs.get(dir_path)
+        if entry is None:
+            return
+        entry["files"][name] = stat_info(file_path, stat, file_hash)
+        self.modified = True
+
+    def remove_file(self, file_path):
+        """從快照中移除單一檔案，返回其狀態"""
+        dir_path, name = os.path.split(file_path)
+        entry = self.dirs.get(dir_path)
+        if entry is None:
+            return None
+        info = entry["files"].pop(name, None)
+        if info is not None:
+            self.modified = True
+        return info
+
+    def get_hash(self, file_path):
+        """取得快照中記錄的檔案標識"""
+        dir_path, name = os.path.split(file_path)
+        entry = self.dirs.get(dir_path)
+        if entry is None:
+            return None
+        info = entry["files"].get(name)
+        return info[2] if info is not None else None
+
+    def move_file(self, src_path, dest_path):
+        """將檔案狀態從舊路徑搬到新路徑，檔案標識沿用不需重新計算"""
+        info = self.remove_file(src_path)
+        dir_path, name = os.path.split(dest_path)
+        entry = self.dirs.get(dir_path)
+        if info is not None and entry is not None:
+            entry["files"][name] = info
+            self.modified = True
+
+    def scan(self, roots):
+        """掃描根資料夾並與快照比對
+
+        只有修改時間改變的資料夾才會重新列出子項目，
+        未改變的資料夾直接沿用快照中的子項目。
+        """
+        result = ScanResult()
+        new_dirs = {}
+        changed = False
+
+        for root in roots:
+            stack = [root]
+            while stack:
+                dir_path = stack.pop()
+                if dir_path in new_dirs:
+                    continue  # 根資料夾互相包含時避免重複掃描
+
+                old_entry = self.dirs.get(dir_path)
+                try:
+                    dir_mtime = os.stat(dir_path).st_mtime_ns
+                except OSError:
+                    if old_entry is not None:
+                        self._collect_removed(dir_path, result.removed)
+                    continue
+
+                if old_entry is not None and old_entry["mtime"] == dir_mtime:
+                    # 資料夾未改變，沿用快照
+                    entry = old_entry
+                    prefix = os.path.join(dir_path, '')
+                    for name, info in entry["files"].items():
+                        result.unchanged.append((prefix + name, name, info[2]))
+                else:
+                    entry = self._scan_directory(dir_path, dir_mtime, old_entry, result)
+                    changed = True
+
+                new_dirs[dir_path] = entry
+                for name in entry["dirs"]:
+                    stack.append(os.path.join(dir_path, name))
+
+        if len(new_dirs) != len(self.dirs):
+            changed = True
+        self.dirs = new_dirs
+        # 取代後才標記，背景儲存不會在取代前清除標記而漏寫新的快照
+        if changed:
+            self.modified = True
+        return result
+
+    def _scan_directory(self, dir_path, dir_mtime, old_entry, result):
+        """重新列出修改時間改變的資料夾，只標記狀態改變的檔案
+
+        直接使用 DirEntry 的名稱與狀態，每個檔案最多一次 stat 系統呼叫。
+        """
+        old_files = old_entry["files"] if old_entry else {}
+        old_dirs = old_entry["dirs"] if old_entry else []
+        files = {}
+        dirs = []
+        # 每個資料夾只組合一次路徑前綴
+        prefix = os.path.join(dir_path, '')
+
+        try:
+            with os.scandir(dir_path) as it:
+                for item in it:
+                    try:
+                        if item.is_dir():
+                            # 與 os.walk 相同，不進入符號連結的資料夾
+                            if not item.is_symlink():
+                                dirs.append(item.name)
+                            continue
+                        stat = item.stat()
+                    except OSError:
+                        continue
+
+                    name = item.name
+                    full_path = prefix + name
+                    old_info = old_files.get(name)
+                    if (old_info is not None and old_info[0] == stat.st_size
+                            and old_info[1] == stat.st_mtime_ns):
+                        files[name] = old_info
+                        result.unchanged.append((full_path, name, old_info[2]))
+                    else:
+                        stat = full_stat(full_path, stat)
+                        info = stat_info(full_path, stat)
+                        files[name] = info
+                        result.changed.append((full_path, name, info, stat))
+        except OSError as e:
+            logger.error(f"讀取資料夾時出錯: {str(e)}")
+
+        for name, info in old_files.items():
+            if name not in files:
+                result.removed.append((os.path.join(dir_path, name), info))
+        for name in old_dirs:
+            if name not in dirs:
+                self._collect_removed(os.path.join(dir_path, name), result.removed)
+
+        return {"mtime": dir_mtime, "files": files, "dirs": dirs}
+
+    def _collect_removed(self, dir_path, removed):
+        """收集快照中某資料夾（含子資料夾）下的所有檔案"""
+        stack = [dir_path]
+        while stack:
+            current = stack.pop()
+            entry = self.dirs.get(current)
+            if entry is None:
+                continue
+            for name, info in entry["files"].items():
+                removed.append((os.path.join(current, name), info))
+            for name in entry["dirs"]:
+                stack.append(os.path.join(current, name))
+
+
+class FingerprintCache:
+    """持久化的檔案標識緩存
+
+    以檔案路徑為鍵值，記錄 [大小, 修改時間(ns), inode/檔案ID, 檔案標識]，
+    只有三項狀態都與目前檔案相同時才使用緩存，避免重新開啟檔案。
+    筆數有上限，超過時淘汰最久未使用的紀錄。
+    """
+
+    def __init__(self, cache_file, max_entries=FINGERPRINT_CACHE_SIZE):
+        self.cache_file = cache_file
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.modified = False
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()  # 同時只有一個執行緒寫入緩存檔案
+
+    def __len__(self):
+        return len(self.entries)
+
+    def load(self):
+        """從磁碟載入緩存，格式不符時視為空緩存"""
+        self.entries = OrderedDict()
+        self.modified = False
+        if not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            if isinstance(data, dict) and data.get('version') == FINGERPRINT_CACHE_VERSION:
+                # 檔案中的順序即為使用順序，最後的為最近使用
+                self.entries = OrderedDict(data.get('entries', {}))
+        except Exception as e:
+            logger.error(f"載入檔案標識緩存時出錯: {str(e)}")
+            self.entries = OrderedDict()
+
+    def save(self):
+        """將緩存寫回磁碟（僅在內容有變動時）
+
+        只在鎖內複製紀錄（紀錄列表只會被取代，不會就地修改），寫入檔案時不阻擋計算檔案標識的執行緒。
+        """
+        with self.save_lock:
+            with self.lock:
+                if not self.modified:
+                    return
+                entries = dict(self.entries)  # 保留使用順序
+                self.modified = False
+            data = {
+                'version': FINGERPRINT_CACHE_VERSION,
+                'entries': entries
+            }
+            temp_file = self.cache_file + '.tmp'
+            try:
+                with open(temp_file, 'w', encoding='utf-8') as file:
+                    json.dump(data, file, ensure_ascii=False, separators=(',', ':'))
+                os.replace(temp_file, self.cache_file)
+            except Exception as e:
+                with self.lock:
+                    self.modified = True
+                logger.error(f"儲存檔案標識緩存時出錯: {str(e)}")
+
+    def get(self, file_path, stat):
+        """取得與目前檔案狀態相符的檔案標識，不相符時返回 None"""
+        with self.lock:
+            entry = self.entries.get(file_path)
+            if entry is None:
+                return None
+            if (entry[0] != stat.st_size or entry[1] != stat.st_mtime_ns
+                    or entry[2] != stat.st_ino):
+                # 檔案已改變，緩存失效
+                del self.entries[file_path]
+                self.modified = True
+                return None
+            self.entries.move_to_end(file_path)
+            return entry[3]
+
+    def put(self, file_path, stat, file_hash):
+        """記錄檔案標識，超過上限時淘汰最久未使用的紀錄"""
+        with self.lock:
+            self.entries[file_path] = [stat.st_size, stat.st_mtime_ns, stat.st_ino, file_hash]
+            self.entries.move_to_end(file_path)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self.modified = True
+
+    def discard(self, file_path):
+        """移除單一檔案的緩存"""
+        with self.lock:
+            if self.entries.pop(file_path, None) is not None:
+                self.modified = True
+
+    def move(self, src_path, dest_path):
+        """檔案搬移或改名後，將緩存移到新路徑（狀態不變，仍然有效）"""
+        with self.lock:
+            entry = self.entries.pop(src_path, None)
+            if entry is not None:
+                self.entries[dest_path] = entry
+                self.modified = True
+
+    def prune(self, is_valid):
+        """移除 is_valid(路徑) 為 False 的紀錄，返回移除的筆數"""
+        with self.lock:
+            paths = list(self.entries)
+        # 檢查可能需要存取磁碟，不在鎖內進行
+        stale = [path for path in paths if not is_valid(path)]
+        with self.lock:
+            for path in stale:
+                self.entries.pop(path, None)
+            if stale:
+                self.modified = True
+        return len(stale)
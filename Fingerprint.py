@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import mmap
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+# 取樣區塊大小，每個檔案固定讀取開頭、中間、結尾各一個區塊
+SAMPLE_BLOCK_SIZE = 64 * 1024
+
+# 完整內容模式無法使用 mmap 時的每次讀取大小
+FULL_READ_SIZE = 1024 * 1024
+
+# 預設使用的檔案標識策略
+DEFAULT_FINGERPRINT_STRATEGY = 'sampled'
+
+# 雜湊算法代碼：x = xxHash (XXH3 128 位元)，b = BLAKE2b (128 位元，未安裝 xxhash 時使用)
+HASH_ALGORITHM = 'x' if xxhash is not None else 'b'
+
+# 策略代碼與雜湊值之間的分隔字元，不會出現在舊版的十六進位檔案標識中
+CODE_SEPARATOR = ':'
+
+
+def _new_hasher(algorithm):
+    """建立指定算法的雜湊物件"""
+    if algorithm == 'x':
+        return xxhash.xxh3_128()
+    return hashlib.blake2b(digest_size=16)
+
+
+def algorithm_available(algorithm):
+    """檢查雜湊算法在目前環境中是否可用"""
+    return algorithm == 'b' or (algorithm == 'x' and xxhash is not None)
+
+
+class LegacyFingerprint:
+    """舊版檔案標識：檔案大小加上頭尾各 4 個字節"""
+
+    name = 'legacy'
+    code = ''
+
+    def compute(self, file_path, size):
+        # 如果檔案小於8字節，直接讀取整個檔案內容
+        if size < 8:
+            with open(file_path, 'rb') as f:
+                content = f.read()
+            return f"{size}_{content.hex()}"
+
+        # 讀取檔案頭尾各4個字節
+        with open(file_path, 'rb') as f:
+            head = f.read(4)
+            f.seek(-4, 2)  # 從檔案末尾向前4個字節
+            tail = f.read(4)
+        return f"{size}_{head.hex()}_{tail.hex()}"
+
+
+class SampledFingerprint:
+    """取樣檔案標識：以快速雜湊計算開頭、中間、結尾三個固定大小的區塊
+
+    每個檔案最多讀取 3 個區塊，讀取量不隨檔案大小增加。
+    """
+
+    name = 'sampled'
+
+    def __init__(self, algorithm=HASH_ALGORITHM, block_size=SAMPLE_BLOCK_SIZE):
+        self.algorithm = algorithm
+        self.block_size = block_size
+        self.code = 's' + algorithm
+
+    def compute(self, file_path, size):
+        hasher = _new_hasher(self.algorithm)
+        block = self.block_size
+        with open(file_path, 'rb') as f:
+            if size <= block * 3:
+                hasher.update(f.read())
+            else:
+                for offset in (0, (size - block) // 2, size - block):
+                    f.seek(offset)
+                    hasher.update(f.read(block))
+        return f"{size}_{self.code}{CODE_SEPARATOR}{hasher.hexdigest()}"
+
+
+class FullFingerprint:
+    """完整內容檔案標識：以 mmap 或大區塊讀取計算整個檔案的雜湊值"""
+
+    name = 'full'
+
+    def __init__(self, algorithm=HASH_ALGORITHM):
+        self.algorithm = algorithm
+        self.code = 'f' + algorithm
+
+    def compute(self, file_path, size):
+        hasher = _new_hasher(self.algorithm)
+        with open(file_path, 'rb') as f:
+            mapped = None
+            if size > 0:
+                try:
+                    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                except (ValueError, OSError):
+                    mapped = None  # 部分網路磁碟不支援 mmap，改用一般讀取
+            if mapped is not None:
+                with mapped:
+                    hasher.update(mapped)
+            else:
+                for chunk in iter(lambda: f.read(FULL_READ_SIZE), b''):
+                    hasher.update(chunk)
+        return f"{size}_{self.code}{CODE_SEPARATOR}{hasher.hexdigest()}"
+
+
+FINGERPRINT_STRATEGIES = {
+    'legacy': LegacyFingerprint,
+    'sampled': SampledFingerprint,
+    'full': FullFingerprint,
+}
+
+
+def get_fingerprint_strategy(name):
+    """依名稱取得檔案標識策略，名稱無效時使用預設策略"""
+    strategy_class = FINGERPRINT_STRATEGIES.get(name, FINGERPRINT_STRATEGIES[DEFAULT_FINGERPRINT_STRATEGY])
+    return strategy_class()
+
+
+def fingerprint_code(file_hash):
+    """取得檔案標識所使用的策略代碼，舊版檔案標識返回空字串
+
+    檔案標識格式為 "大小_代碼:雜湊值"；舊版格式在大小之後只有十六進位字元與底線，
+    因此沒有分隔字元的檔案標識都視為舊版（例如 JPEG 開頭的 "ffd8" 不會被誤認為代碼）。
+    """
+    if not file_hash:
+        return None
+    _, _, rest = file_hash.partition('_')
+    code, separator, _ = rest.partition(CODE_SEPARATOR)
+    return code if separator else ''
+
+
+def strategy_for_code(code):
+    """依策略代碼建立可重新計算該檔案標識的策略，無法計算時返回 None"""
+    if code == '':
+        return LegacyFingerprint()
+    if code is None or len(code) != 2 or not algorithm_available(code[1]):
+        return None
+    if code[0] == 's':
+        return SampledFingerprint(code[1])
+    if code[0] == 'f':
+        return FullFingerprint(code[1])
+    return None
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import ctypes
+import logging
+import threading
+
+logger = logging.getLogger('TagArtisan')
+
+# 按住快捷鍵期間檢查是否放開的間隔（秒），放開後不再輪詢
+RELEASE_POLL_INTERVAL = 0.03
+
+# RegisterHotKey 的修飾鍵旗標
+MODIFIER_FLAGS = {
+    "Ctrl": 0x0002,
+    "Alt": 0x0001,
+    "Shift": 0x0004
+}
+# 修飾鍵的虛擬鍵碼
+MODIFIER_KEYS = {
+    "Ctrl": 0x11,  # VK_CONTROL
+    "Alt": 0x12,   # VK_MENU
+    "Shift": 0x10  # VK_SHIFT
+}
+MOD_NOREPEAT = 0x4000  # 按住時不重複送出 WM_HOTKEY
+WM_HOTKEY = 0x0312
+WM_QUIT = 0x0012
+
+
+class Win32HotkeyBackend:
+    """以 RegisterHotKey 等待全域快捷鍵
+
+    快捷鍵註冊在監聽執行緒的訊息佇列上，等待按下時阻塞在 GetMessage，不消耗 CPU；
+    WM_HOTKEY 沒有放開的通知，因此只在按住期間輪詢按鍵狀態。
+    每個實例只供一個監聽執行緒使用一次。
+    """
+
+    hotkey_id = 1
+
+    def __init__(self):
+        self.thread_id = None
+        self.keys = ()
+        self.stopping = threading.Event()
+
+    def register(self, modifier, key):
+        """在目前執行緒註冊快捷鍵，失敗時返回 False"""
+        user32 = ctypes.windll.user32
+        self.thread_id = ctypes.windll.kernel32.GetCurrentThreadId()
+        key_vk = ord(key.upper())
+        self.keys = (MODIFIER_KEYS.get(modifier, 0x11), key_vk)
+        modifier_flag = MODIFIER_FLAGS.get(modifier, 0x0002)
+        return bool(user32.RegisterHotKey(None, self.hotkey_id, modifier_flag | MOD_NOREPEAT, key_vk))
+
+    def unregister(self):
+        ctypes.windll.user32.UnregisterHotKey(None, self.hotkey_id)
+
+    def wait_pressed(self):
+        """阻塞到快捷鍵按下，停止時返回 False"""
+        from ctypes import wintypes
+        user32 = ctypes.windll.user32
+        msg = wintypes.MSG()
+        while not self.stopping.is_set():
+            # 收到 WM_QUIT 時返回 0，錯誤時返回 -1
+            if user32.GetMessageW(ctypes.byref(msg), None, 0, 0) <= 0:
+                return False
+            if msg.message == WM_HOTKEY and msg.wParam == self.hotkey_id:
+                return True
+        return False
+
+    def wait_released(self):
+        """阻塞到快捷鍵放開，停止時返回 False"""
+        user32 = ctypes.windll.user32
+        while all(user32.GetAsyncKeyState(key_vk) & 0x8000 for key_vk in self.keys):
+            if self.stopping.wait(RELEASE_POLL_INTERVAL):
+                return False
+        return not self.stopping.is_set()
+
+    def stop(self):
+        """從其他執行緒喚醒並結束等待"""
+        self.stopping.set()
+        if self.thread_id is not None:
+            ctypes.windll.user32.PostThreadMessageW(self.thread_id, WM_QUIT, 0, 0)
+
+
+def default_backend_factory():
+    """目前平台可用的快捷鍵實作，不支援時返回 None"""
+    if os.name == 'nt':
+        return Win32HotkeyBackend
+    return None
+
+
+class HotkeyListener:
+    """在背景執行緒等待全域快捷鍵，按下與放開時將 'show' / 'hide' 放入佇列
+
+    backend_factory 建立快捷鍵實作，需提供 register(modifier, key)、unregister()、
+    wait_pressed()、wait_released() 與 stop()，等待方法在停止時返回 False。
+    每次放入事件後呼叫 notify（例如以虛擬事件喚醒 Tk 主線程），主線程不需定時檢查佇列。
+    """
+
+    def __init__(self, events, notify=None, backend_factory=None):
+        self.events = events
+        self.notify = notify
+        self.backend_factory = backend_factory or default_backend_factory()
+        self.backend = None
+        self.thread = None
+
+    def start(self, modifier, key):
+        """以指定的快捷鍵開始監聽，已在監聽時先停止"""
+        self.stop()
+        if self.backend_factory is None:
+            return
+        self.backend = self.backend_factory()
+        self.thread = threading.Thread(target=self._run, args=(self.backend, modifier, key),
+                                       name='HotkeyListener', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """停止監聽並取消註冊快捷鍵"""
+        if self.backend is None:
+            return
+        self.backend.stop()
+        if self.thread is not threading.current_thread():
+            self.thread.join(timeout=1)
+        self.backend = None
+        self.thread = None
+
+    def _post(self, event):
+        self.events.put(event)
+        if self.notify is not None:
+            self.notify()
+
+    def _run(self, backend, modifier, key):
+        if not backend.register(modifier, key):
+            logger.warning(f"無法註冊全域快捷鍵 {modifier}+{key}")
+            return
+        try:
+            while backend.wait_pressed():
+                self._post('show')
+                if not backend.wait_released():
+                    break
+                self._post('hide')
+        except Exception as e:
+            logger.error(f"監聽快捷鍵時發生錯誤: {e}")
+        finally:
+            backend.unregister()
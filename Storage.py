@@ -0,0 +1,310 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import sqlite3
+import threading
+import logging
+
+logger = logging.getLogger('TagArtisan')
+
+# 背景寫入的最短間隔（秒），間隔內的多次儲存請求合併為一次寫入
+SAVE_INTERVAL = 0.5
+
+
+def read_json_db(json_file):
+    """讀取 JSON 格式的資料庫，返回 (紀錄, 標籤顏色, 標籤顏色修改時間)"""
+    with open(json_file, 'r', encoding='utf-8') as file:
+        data = json.load(file)
+    if isinstance(data, dict) and 'files' in data:
+        return data['files'], data.get('tag_colors', {}), data.get('tag_color_timestamps', {})
+    # 舊版本格式，只有文件數據
+    return data, {}, {}
+
+
+def write_json_db(json_file, files, tag_colors, tag_color_timestamps):
+    """以 JSON 格式寫出資料庫（原有的 file_tags.json 格式），先寫入暫存檔再取代"""
+    data = {
+        'files': files,
+        'tag_colors': tag_colors,
+        'tag_color_timestamps': tag_color_timestamps
+    }
+    temp_file = json_file + '.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as file:
+        json.dump(data, file, indent=4, ensure_ascii=False)
+    os.replace(temp_file, json_file)
+
+
+class JsonStorage:
+    """以單一 JSON 檔案保存資料庫，每次儲存都重寫整個檔案"""
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+
+    def exists(self):
+        return os.path.exists(self.db_file)
+
+    def load(self):
+        if not self.exists():
+            return {}, {}, {}
+        return read_json_db(self.db_file)
+
+    def save(self, files, tag_colors, tag_color_timestamps, dirty_keys=None):
+        """寫出整個資料庫（dirty_keys 僅為相容介面，JSON 格式無法只寫入部分紀錄）"""
+        write_json_db(self.db_file, files, tag_colors, tag_color_timestamps)
+
+    def close(self):
+        pass
+
+
+class SqliteStorage:
+    """以 SQLite (WAL 模式) 保存資料庫
+
+    紀錄、路徑、標籤與紀錄標籤關聯各自一個資料表，
+    儲存時只寫入有變動的紀錄，不需重寫整個資料庫。
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        CREATE TABLE IF NOT EXISTS records (
+            id INTEGER PRIMARY KEY,
+            key TEXT NOT NULL UNIQUE,
+            name TEXT,
+            hash TEXT,
+            note TEXT NOT NULL DEFAULT ''
+        );
+        CREATE TABLE IF NOT EXISTS paths (
+            record_id INTEGER NOT NULL REFERENCES records(id) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            path TEXT NOT NULL,
+            PRIMARY KEY (record_id, position)
+        );
+        CREATE INDEX IF NOT EXISTS paths_path ON paths(path);
+        CREATE TABLE IF NOT EXISTS tags (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE,
+            color TEXT,
+            color_timestamp REAL
+        );
+        CREATE TABLE IF NOT EXISTS record_tags (
+            record_id INTEGER NOT NULL REFERENCES records(id) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            tag_id INTEGER NOT NULL REFERENCES tags(id),
+            PRIMARY KEY (record_id, position)
+        );
+        CREATE INDEX IF NOT EXISTS record_tags_tag ON record_tags(tag_id);
+    """
+
+    # 固定的 SQL 字串，由 sqlite3 的語句快取重複使用已編譯的語句
+    SQL_UPSERT_RECORD = (
+        "INSERT INTO records (key, name, hash, note) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(key) DO UPDATE SET name = excluded.name, hash = excluded.hash, note = excluded.note"
+    )
+    SQL_RECORD_ID = "SELECT id FROM records WHERE key = ?"
+    SQL_DELETE_RECORD = "DELETE FROM records WHERE key = ?"
+    SQL_DELETE_PATHS = "DELETE FROM paths WHERE record_id = ?"
+    SQL_INSERT_PATH = "INSERT INTO paths (record_id, position, path) VALUES (?, ?, ?)"
+    SQL_DELETE_RECORD_TAGS = "DELETE FROM record_tags WHERE record_id = ?"
+    SQL_INSERT_RECORD_TAG = "INSERT INTO record_tags (record_id, position, tag_id) VALUES (?, ?, ?)"
+    SQL_INSERT_TAG = "INSERT OR IGNORE INTO tags (name) VALUES (?)"
+    SQL_TAG_ID = "SELECT id FROM tags WHERE name = ?"
+    SQL_CLEAR_COLORS = "UPDATE tags SET color = NULL, color_timestamp = NULL WHERE color IS NOT NULL OR color_timestamp IS NOT NULL"
+    SQL_SET_COLOR = "UPDATE tags SET color = ?, color_timestamp = ? WHERE id = ?"
+    SQL_PRUNE_TAGS = (
+        "DELETE FROM tags WHERE color IS NULL AND color_timestamp IS NULL "
+        "AND id NOT IN (SELECT tag_id FROM record_tags)"
+    )
+    SQL_GET_META = "SELECT value FROM meta WHERE key = ?"
+    SQL_SET_META = "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)"
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self.lock = threading.Lock()
+        self.tag_ids = {}  # 標籤名稱 -> 標籤 ID
+        self.saved_colors = None  # 上次寫入的 (標籤顏色, 修改時間)，未改變時不重寫
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        with self.conn:
+            self.conn.executescript(self.SCHEMA)
+
+    def get_meta(self, key):
+        with self.lock:
+            row = self.conn.execute(self.SQL_GET_META, (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        with self.lock, self.conn:
+            self.conn.execute(self.SQL_SET_META, (key, value))
+
+    def load(self):
+        """載入整個資料庫，返回 (紀錄, 標籤顏色, 標籤顏色修改時間)"""
+        with self.lock:
+            files = {}
+            records_by_id = {}
+            for record_id, key, name, file_hash, note in self.conn.execute(
+                    "SELECT id, key, name, hash, note FROM records"):
+                record = {"tags": [], "note": note, "hash": file_hash, "paths": [], "name": name}
+                files[key] = record
+                records_by_id[record_id] = record
+
+            for record_id, path in self.conn.execute(
+                    "SELECT record_id, path FROM paths ORDER BY record_id, position"):
+                records_by_id[record_id]["paths"].append(path)
+
+            self.tag_ids = {}
+            tag_names = {}
+            tag_colors = {}
+            tag_color_timestamps = {}
+            for tag_id, name, color, timestamp in self.conn.execute(
+                    "SELECT id, name, color, color_timestamp FROM tags"):
+                self.tag_ids[name] = tag_id
+                tag_names[tag_id] = name
+                if color is not None:
+                    tag_colors[name] = color
+                if timestamp is not None:
+                    tag_color_timestamps[name] = timestamp
+
+            for record_id, tag_id in self.conn.execute(
+                    "SELECT record_id, tag_id FROM record_tags ORDER BY record_id, position"):
+                records_by_id[record_id]["tags"].append(tag_names[tag_id])
+
+            self.saved_colors = (dict(tag_colors), dict(tag_color_timestamps))
+            return files, tag_colors, tag_color_timestamps
+
+    def save(self, files, tag_colors, tag_color_timestamps, dirty_keys=None):
+        """寫入資料庫
+
+        dirty_keys 為有變動的紀錄鍵值，只寫入這些紀錄（已不存在的鍵值會被刪除）；
+        為 None 時以 files 取代資料庫中所有紀錄。
+        """
+        with self.lock:
+            try:
+                self._save(files, tag_colors, tag_color_timestamps, dirty_keys)
+            except Exception:
+                # 交易已回復：交易中配置的標籤 ID 與寫入的顏色都不存在，捨棄快取，下次由資料庫重新取得
+                self.tag_ids = {}
+                self.saved_colors = None
+                raise
+
+    def _save(self, files, tag_colors, tag_color_timestamps, dirty_keys):
+        colors = (tag_colors, tag_color_timestamps)
+        write_colors = colors != self.saved_colors
+        with self.conn:
+            cursor = self.conn.cursor()
+            if dirty_keys is None:
+                cursor.execute("DELETE FROM records")
+                for key, record in files.items():
+                    self._write_record(cursor, key, record)
+            else:
+                for key in dirty_keys:
+                    record = files.get(key)
+                    if record is None:
+                        cursor.execute(self.SQL_DELETE_RECORD, (key,))
+                    else:
+                        self._write_record(cursor, key, record)
+
+            if write_colors:
+                self._write_colors(cursor, tag_colors, tag_color_timestamps)
+
+            if dirty_keys is None:
+                self._prune_tags(cursor)
+        # 交易提交後才記錄已寫入的顏色
+        if write_colors:
+            self.saved_colors = (dict(tag_colors), dict(tag_color_timestamps))
+
+    def _write_record(self, cursor, key, record):
+        """寫入單筆紀錄及其路徑與標籤"""
+        cursor.execute(self.SQL_UPSERT_RECORD,
+                       (key, record.get("name"), record.get("hash"), record.get("note") or ""))
+        record_id = cursor.execute(self.SQL_RECORD_ID, (key,)).fetchone()[0]
+        cursor.execute(self.SQL_DELETE_PATHS, (record_id,))
+        cursor.executemany(self.SQL_INSERT_PATH,
+                           [(record_id, position, path) for position, path in enumerate(record.get("paths", []))])
+        cursor.execute(self.SQL_DELETE_RECORD_TAGS, (record_id,))
+        cursor.executemany(self.SQL_INSERT_RECORD_TAG,
+                           [(record_id, position, self._tag_id(cursor, tag))
+                            for position, tag in enumerate(record.get("tags", []))])
+
+    def _tag_id(self, cursor, tag):
+        """取得標籤 ID，不存在時建立"""
+        tag_id = self.tag_ids.get(tag)
+        if tag_id is None:
+            cursor.execute(self.SQL_INSERT_TAG, (tag,))
+            tag_id = cursor.execute(self.SQL_TAG_ID, (tag,)).fetchone()[0]
+            self.tag_ids[tag] = tag_id
+        return tag_id
+
+    def _write_colors(self, cursor, tag_colors, tag_color_timestamps):
+        """以目前的標籤顏色取代資料庫中的顏色設定"""
+        cursor.execute(self.SQL_CLEAR_COLORS)
+        for tag in set(tag_colors) | set(tag_color_timestamps):
+            cursor.execute(self.SQL_SET_COLOR,
+                           (tag_colors.get(tag), tag_color_timestamps.get(tag), self._tag_id(cursor, tag)))
+
+    def _prune_tags(self, cursor):
+        """刪除沒有任何紀錄使用且沒有顏色設定的標籤"""
+        cursor.execute(self.SQL_PRUNE_TAGS)
+        self.tag_ids = {name: tag_id for tag_id, name in cursor.execute("SELECT id, name FROM tags")}
+
+    def import_json(self, json_file):
+        """從舊的 JSON 資料庫匯入（取代現有紀錄），返回匯入的紀錄數"""
+        files, tag_colors, tag_color_timestamps = read_json_db(json_file)
+        self.save(files, tag_colors, tag_color_timestamps)
+        return len(files)
+
+    def close(self):
+        with self.lock:
+            try:
+                with self.conn:
+                    self._prune_tags(self.conn.cursor())
+                self.conn.close()
+            except Exception as e:
+                logger.error(f"關閉資料庫時出錯: {str(e)}")
+
+
+class DebouncedSaver:
+    """背景寫入執行緒：收到儲存請求後等待一段時間，將期間內的所有請求合併為一次寫入"""
+
+    def __init__(self, flush_callback, interval=SAVE_INTERVAL):
+        self.flush_callback = flush_callback
+        self.interval = interval
+        self.requested = threading.Event()
+        self.stopped = threading.Event()
+        self.flush_lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+        self.thread.start()
+
+    def request(self):
+        """要求在下一個寫入時間點儲存"""
+        self.requested.set()
+
+    def _run(self):
+        while not self.stopped.is_set():
+            self.requested.wait()
+            if self.stopped.is_set():
+                break
+            # 等待間隔時間以合併後續的請求，關閉時立即結束等待
+            self.stopped.wait(self.interval)
+            self.requested.clear()
+            self.flush()
+
+    def flush(self):
+        """立即寫入（寫入期間的新請求由下一次寫入處理）"""
+        with self.flush_lock:
+            try:
+                self.flush_callback()
+            except Exception as e:
+                logger.error(f"背景儲存資料庫時出錯: {str(e)}")
+
+    def close(self):
+        """停止背景執行緒並寫入尚未儲存的變動"""
+        self.stopped.set()
+        self.requested.set()
+        self.thread.join()
+        self.flush()
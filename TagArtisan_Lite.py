@@ -52,9 +52,15 @@ import logging
 import tempfile
 from packaging import version
 import traceback
-import itertools
 import tkinter.colorchooser as colorchooser
 from TagDropWindow import TagDropWindow
+from VirtualFileList import VirtualFileList
+from TreeSync import TreeReconciler
+from FileScanner import DirectorySnapshot, FingerprintCache, DEFAULT_HASH_WORKERS, file_identity, fingerprint_files
+from Fingerprint import DEFAULT_FINGERPRINT_STRATEGY, get_fingerprint_strategy, fingerprint_code, strategy_for_code
+from Storage import SqliteStorage, JsonStorage, DebouncedSaver, write_json_db
+from TagIndex import QueryCache, QueryResult, TagIndex, TAG_INDEX_BACKENDS
+from TagQuery import QueryPlanner, QuerySyntaxError, is_query, parse_query
 import random
 from ctypes import windll, wintypes
 
@@ -314,7 +320,7 @@ class FileChangeHandler(FileSystemEventHandler):
         self.last_event_time = 0
         self.event_delay = 2  # 增加事件延遲到2秒
         self._lock = threading.Lock()
-        self._pending_events = set()  # 用於追蹤待處理的事件
+        self._pending_events = []  # 待處理的事件 (事件類型, 來源路徑, 目的路徑, 是否為資料夾)
         self._event_timer = None
 
     def on_any_event(self, event):
@@ -323,9 +329,16 @@ class FileChangeHandler(FileSystemEventHandler):
             return
 
         current_time = time.time()
+        pending_event = (
+            event.event_type,
+            event.src_path,
+            getattr(event, 'dest_path', ''),
+            event.is_directory
+        )
         with self._lock:
-            # 將事件添加到待處理集合
-            self._pending_events.add(event.src_path)
+            # 將事件添加到待處理列表（忽略連續重複的事件）
+            if not self._pending_events or self._pending_events[-1] != pending_event:
+                self._pending_events.append(pending_event)
             
             # 如果已經有計時器在運行，取消它
             if self._event_timer:
@@ -341,10 +354,11 @@ class FileChangeHandler(FileSystemEventHandler):
     def _process_pending_events(self):
         """處理所有待處理的事件"""
         with self._lock:
-            if self._pending_events:
-                self._pending_events.clear()
-                self.callback()
+            events = self._pending_events
+            self._pending_events = []
             self._event_timer = None
+        if events:
+            self.callback(events)
 
 class FileManager:
     def __init__(self):
@@ -352,195 +366,259 @@ class FileManager:
         self.folder_paths = []
         self.files_tags = {}
         self.db_data = {}
-        self.hash_cache = {}
+        self.dirty_keys = set()  # 已變動但尚未要求儲存的紀錄鍵值
+        self.pending_keys = set()  # 已要求儲存、等待背景寫入的紀錄鍵值（None 表示全部）
+        self.save_requested = False
+        self.file_state_requested = False  # 資料夾快照與檔案標識緩存等待背景寫入
+        self.save_lock = threading.Lock()
+        self.name_index = {}  # 檔案名稱 -> 紀錄鍵值集合
+        self.path_index = {}  # 檔案路徑 -> 紀錄鍵值
+        self.tag_index = TagIndex()  # 標籤 -> files_tags 中的檔案
+        self.query_cache = QueryCache()  # 最近的檔案列表查詢結果
         
         # 获取应用数据目录
         self.app_data_dir = get_app_data_dir()
         
         # 设置数据文件路径
-        self.db_file = os.path.join(self.app_data_dir, 'file_tags.json')
+        self.db_file = os.path.join(self.app_data_dir, 'file_tags.json')  # 舊版 JSON 資料庫，只在首次啟動時匯入
         self.backup_dir = os.path.join(self.app_data_dir, 'backups')
+        self.storage = SqliteStorage(os.path.join(self.app_data_dir, 'file_tags.db'))
+        
+        # 檔案標識策略
+        self.fingerprint = get_fingerprint_strategy(DEFAULT_FINGERPRINT_STRATEGY)
+        
+        # 資料夾快照，供增量掃描使用
+        self.snapshot = DirectorySnapshot(os.path.join(self.app_data_dir, 'scan_snapshot.json'), self.fingerprint.code)
+        self.snapshot.load()
+        
+        # 持久化的檔案標識緩存，檔案未改變時不需重新讀取內容
+        self.hash_cache = FingerprintCache(os.path.join(self.app_data_dir, 'fingerprint_cache.json'))
+        self.hash_cache.load()
+        self.hash_workers = DEFAULT_HASH_WORKERS  # 並行計算檔案標識的執行緒數
         
         self.observers = []  # 初始化observers列表
         self.event_handler = None
+        self.lock = threading.RLock()  # 保護掃描與監控事件同時修改資料
         self.tag_colors = {}  # 添加標籤顏色字典
         self.tag_color_timestamps = {}  # 添加標籤顏色修改時間字典
+        self.tag_color_generation = 0  # 標籤顏色每次變更時遞增
+        self.tag_view = ()  # 快取的標籤顯示順序
+        self.tag_view_key = None  # 計算 tag_view 時的索引版本與顏色版本
         os.makedirs(self.backup_dir, exist_ok=True)
         self.load_db()
+        self.saver = DebouncedSaver(self.flush_pending)  # 背景寫入資料庫、快照與緩存
         self.file_monitor = None
         self.monitoring = False
         self.default_color = "#2b3e50"  # 設置預設顏色為 superhero 主題的背景色
 
-    def calculate_file_hash(self, file_path):
-        """使用檔案大小和檔案頭尾字節作為檔案的唯一標識"""
+    def calculate_file_hash(self, file_path, stat=None):
+        """以目前的檔案標識策略計算檔案的唯一標識
+        
+        檔案的大小、修改時間與 inode 與緩存相同時直接使用緩存，不開啟檔案。
+        掃描時可傳入已取得的檔案狀態，避免重複呼叫 os.stat()。
+        """
         try:
-            # 獲取檔案大小
-            file_size = os.path.getsize(file_path)
-            
-            # 如果檔案小於8字節，直接讀取整個檔案內容
-            if file_size < 8:
-                with open(file_path, 'rb') as f:
-                    content = f.read()
-                return f"{file_size}_{content.hex()}"
+            if stat is None:
+                stat = os.stat(file_path)
+            file_id = self.hash_cache.get(file_path, stat)
+            if file_id and fingerprint_code(file_id) == self.fingerprint.code:
+                return file_id
             
-            # 讀取檔案頭尾各4個字節
-            with open(file_path, 'rb') as f:
-                head = f.read(4)
-                f.seek(-4, 2)  # 從檔案末尾向前4個字節
-                tail = f.read(4)
-            
-            # 生成唯一標識（使用大小和頭尾字節的組合）
-            file_id = f"{file_size}_{head.hex()}_{tail.hex()}"
+            file_id = self.fingerprint.compute(file_path, stat.st_size)
             
             # 更新緩存
-            self.hash_cache[file_path] = file_id
+            self.hash_cache.put(file_path, stat, file_id)
             
             return file_id
         except Exception as e:
             logger.error(f"計算檔案標識時出錯: {str(e)}")
             return None
 
-    def clean_cache(self):
-        """清理不存在的檔案的緩存"""
-        for file_path in list(self.hash_cache.keys()):
-            if not os.path.exists(file_path):
-                del self.hash_cache[file_path]
-
-    def set_folder_paths(self, folder_paths):
-        """設置要監控的資料夾路徑，更新檔案列表和雜湊值"""
-        self.folder_paths = [os.path.abspath(path) for path in folder_paths]
-        self.files_tags = {}
+    def set_fingerprint_strategy(self, name):
+        """切換檔案標識策略，舊策略的紀錄會在下次遇到該檔案時延遲轉換"""
+        strategy = get_fingerprint_strategy(name)
+        if strategy.code == self.fingerprint.code:
+            return
+        with self.lock:
+            self.fingerprint = strategy
+            # 快照中的檔案標識屬於舊策略，改載入與新策略相符的快照（沒有時重新掃描）
+            self.snapshot.fingerprint = strategy.code
+            self.snapshot.load()
 
-        # 掃描所有資料夾中的檔案
-        for folder_path in self.folder_paths:
-            if not os.path.exists(folder_path):
+    def _migrate_record(self, file_path, file_name, current_hash, stat=None):
+        """將同檔名、以其他策略計算檔案標識的紀錄改用目前的檔案標識作為鍵值
+        
+        以紀錄原本的策略重新計算此檔案的標識，相符時才轉換。返回是否已轉換。
+        """
+        computed = {}
+        for db_key in list(self.name_index.get(file_name, ())):
+            record = self.db_data[db_key]
+            code = fingerprint_code(record["hash"])
+            if code is None or code == self.fingerprint.code:
+                continue
+            if code not in computed:
+                strategy = strategy_for_code(code)
+                computed[code] = None
+                if strategy is not None:
+                    try:
+                        size = stat.st_size if stat is not None else os.path.getsize(file_path)
+                        computed[code] = strategy.compute(file_path, size)
+                    except Exception as e:
+                        logger.error(f"計算檔案標識時出錯: {str(e)}")
+            if computed[code] != record["hash"]:
                 continue
             
-            for root, _, files in os.walk(folder_path):
-                for file in files:
-                    full_path = os.path.abspath(os.path.join(root, file))
-                    file_name = os.path.basename(full_path)
-                    
-                    # 檢查資料庫中是否有相同檔名的記錄
-                    name_exists = False
-                    for db_key, info in self.db_data.items():
-                        if info.get("name") == file_name:
-                            name_exists = True
-                            break
-                    
-                    # 如果檔案名稱不存在於資料庫中，直接加入檔案列表
-                    if not name_exists:
-                        self.files_tags[full_path] = {
-                            "tags": [],
-                            "note": "",
-                            "hash": None,
-                            "name": file_name
-                        }
-                        continue
-                    
-                    current_hash = self.calculate_file_hash(full_path)
-                    if not current_hash:
-                        continue
-                    
-                    # 使用檔案名稱和雜湊值組合作為鍵值
-                    current_db_key = f"{file_name}_{current_hash}"
-                    
-                    # 檢查是否存在相同檔名但不同雜湊值的紀錄
-                    found_old_record = False
-                    for db_key in list(self.db_data.keys()):
-                        if file_name in db_key and full_path in self.db_data[db_key]["paths"]:
-                            if db_key != current_db_key:  # 雜湊值不同
-                                # 從舊紀錄中移除當前路徑
-                                self.db_data[db_key]["paths"].remove(full_path)
-                                
-                                # 如果舊紀錄沒有其他路徑且有標籤或備註，則複製到新紀錄
-                                if (not self.db_data[db_key]["paths"] and 
-                                    (self.db_data[db_key]["tags"] or self.db_data[db_key]["note"])):
-                                    # 建立新紀錄，沿用舊紀錄的標籤和備註
-                                    self.db_data[current_db_key] = {
-                                        "tags": self.db_data[db_key]["tags"].copy(),
-                                        "note": self.db_data[db_key]["note"],
-                                        "hash": current_hash,
-                                        "paths": [full_path],
-                                        "name": file_name
-                                    }
-                                    # 如果舊紀錄沒有其他路徑，可以刪除
-                                    del self.db_data[db_key]
-                                else:
-                                    # 如果舊紀錄有標籤或備註，建立新紀錄
-                                    if self.db_data[db_key]["tags"] or self.db_data[db_key]["note"]:
-                                        self.db_data[current_db_key] = {
-                                            "tags": self.db_data[db_key]["tags"].copy(),
-                                            "note": self.db_data[db_key]["note"],
-                                            "hash": current_hash,
-                                            "paths": [full_path],
-                                            "name": file_name
-                                        }
-                            
-                            found_old_record = True
-                            break
-                    
-                    # 如果沒有找到舊紀錄，則檢查是否有相同雜湊值的紀錄
-                    if not found_old_record:
-                        if current_db_key in self.db_data:
-                            if full_path not in self.db_data[current_db_key]["paths"]:
-                                self.db_data[current_db_key]["paths"].append(full_path)
-                                self.db_data[current_db_key]["hash"] = current_hash
-                                self.db_data[current_db_key]["name"] = file_name
-                        else:
-                            # 建立新記錄
-                            self.db_data[current_db_key] = {
-                                "tags": [],
-                                "note": "",
-                                "hash": current_hash,
-                                "paths": [full_path],
-                                "name": file_name
-                            }
-                    
-                    # 更新 files_tags
-                    if current_db_key in self.db_data:
-                        self.files_tags[full_path] = {
-                            "tags": self.db_data[current_db_key]["tags"],
-                            "note": self.db_data[current_db_key]["note"],
-                            "hash": current_hash,
-                            "name": file_name
-                        }
-                    else:
-                        self.files_tags[full_path] = {
-                            "tags": [],
-                            "note": "",
-                            "hash": current_hash,
-                            "name": file_name
-                        }
+            self._delete_record(db_key)
+            record["hash"] = current_hash
+            if file_path not in record["paths"]:
+                record["paths"].append(file_path)
+            self._put_record(f"{file_name}_{current_hash}", record)
+            return True
+        return False
 
-        # 清理沒有標籤和備註的紀錄
-        for key in list(self.db_data.keys()):
-            if not self.db_data[key]["tags"] and not self.db_data[key]["note"]:
-                del self.db_data[key]
+    def clean_cache(self):
+        """清理不存在的檔案的緩存
+        
+        監控資料夾內的檔案以掃描結果判斷，其他檔案才檢查是否存在。
+        """
+        def is_valid(file_path):
+            if file_path in self.files_tags:
+                return True
+            if self.is_in_folders(file_path):
+                return False
+            return os.path.exists(file_path)
+        
+        self.hash_cache.prune(is_valid)
+        self.hash_cache.save()
 
-        # 儲存更新後的資料庫
-        self.save_db()
+    def load_db(self):
+        """載入資料庫，包括標籤顏色信息
+        
+        首次使用 SQLite 資料庫時，從舊版的 file_tags.json 匯入一次。
+        """
+        if not self.storage.get_meta('json_imported'):
+            if os.path.exists(self.db_file):
+                try:
+                    count = self.storage.import_json(self.db_file)
+                    logger.info(f"已從 JSON 資料庫匯入 {count} 筆紀錄")
+                except Exception as e:
+                    logger.error(f"匯入 JSON 資料庫時出錯: {str(e)}")
+                    raise
+            self.storage.set_meta('json_imported', datetime.now().isoformat())
+        
+        self.db_data, self.tag_colors, self.tag_color_timestamps = self.storage.load()
+        self.rebuild_index()
+        self.dirty_keys = set()
 
-        # 在最後加入更新監控的程式碼
-        if hasattr(self, 'event_handler') and self.event_handler:
-            self.start_monitoring(self.event_handler.callback)
+    def rebuild_index(self):
+        """根據 db_data 重建檔名與路徑索引
+        
+        直接修改 db_data 或 files_tags 後呼叫，所有紀錄都會在下次儲存時寫入資料庫。
+        """
+        self.dirty_keys = None
+        self.name_index = {}
+        self.path_index = {}
+        for db_key in self.db_data:
+            self._index_record(db_key)
+        self.rebuild_tag_index()
+
+    def rebuild_tag_index(self, index_class=None):
+        """根據 files_tags 建立新的標籤反向索引，完成後才取代目前的索引"""
+        index = self._new_tag_index(index_class)
+        for file_path, info in self.files_tags.items():
+            index.update(file_path, info.get("tags", []))
+        index.compact()
+        self.tag_index = index
 
-    def load_db(self):
-        """載入資料庫，包括標籤顏色信息"""
-        if os.path.exists(self.db_file):
-            with open(self.db_file, 'r', encoding='utf-8') as file:
-                data = json.load(file)
-                if isinstance(data, dict) and 'files' in data:
-                    self.db_data = data['files']
-                    self.tag_colors = data.get('tag_colors', {})
-                    self.tag_color_timestamps = data.get('tag_color_timestamps', {})
-                else:
-                    # 舊版本格式，只有文件數據
-                    self.db_data = data
-                    self.tag_colors = {}
-                    self.tag_color_timestamps = {}
-        else:
-            self.db_data = {}
+    def _new_tag_index(self, index_class=None):
+        """建立空的標籤索引，版本接續目前的索引
+        
+        不清空目前的索引：檔案 ID 會重新配置，仍在使用舊索引的查詢結果（例如捲動中的檔案列表）
+        須繼續以舊索引取出路徑。
+        """
+        index = (index_class or type(self.tag_index))()
+        index.generation = self.tag_index.generation + 1
+        return index
+
+    def set_tag_index_backend(self, name):
+        """切換標籤索引的實作（'set' 或 'bitmap'），並重建索引"""
+        index_class = TAG_INDEX_BACKENDS.get(name, TagIndex)
+        if type(self.tag_index) is index_class:
+            return
+        self.query_cache.clear()
+        self.rebuild_tag_index(index_class)
+
+    def _index_tags(self, file_path):
+        """更新檔案在標籤索引中的標籤
+        
+        同一紀錄的其他路徑可能與此檔案共用標籤列表，一併更新。
+        """
+        paths = [file_path]
+        db_key = self.path_index.get(file_path)
+        if db_key is not None and db_key in self.db_data:
+            paths.extend(self.db_data[db_key]["paths"])
+        for path in paths:
+            info = self.files_tags.get(path)
+            if info is None:
+                self.tag_index.remove(path)
+            else:
+                self.tag_index.update(path, info["tags"])
+
+    def _index_record(self, db_key):
+        """將紀錄加入檔名與路徑索引"""
+        record = self.db_data[db_key]
+        self.name_index.setdefault(record.get("name"), set()).add(db_key)
+        for path in record.get("paths", []):
+            self.path_index[path] = db_key
+
+    def _unindex_record(self, db_key):
+        """將紀錄從檔名與路徑索引中移除"""
+        record = self.db_data.get(db_key)
+        if record is None:
+            return
+        keys = self.name_index.get(record.get("name"))
+        if keys is not None:
+            keys.discard(db_key)
+            if not keys:
+                del self.name_index[record.get("name")]
+        for path in record.get("paths", []):
+            if self.path_index.get(path) == db_key:
+                del self.path_index[path]
+
+    def _mark_dirty(self, db_key):
+        """標記紀錄已變動，下次儲存時寫入資料庫"""
+        if self.dirty_keys is not None:
+            self.dirty_keys.add(db_key)
+
+    def _put_record(self, db_key, record):
+        """新增或取代紀錄，並同步索引"""
+        self._unindex_record(db_key)
+        self.db_data[db_key] = record
+        self._index_record(db_key)
+        self._mark_dirty(db_key)
+
+    def _delete_record(self, db_key):
+        """刪除紀錄，並同步索引"""
+        self._unindex_record(db_key)
+        del self.db_data[db_key]
+        self._mark_dirty(db_key)
+
+    def _add_record_path(self, db_key, path):
+        """將路徑加入紀錄"""
+        paths = self.db_data[db_key]["paths"]
+        if path not in paths:
+            paths.append(path)
+        self.path_index[path] = db_key
+        self._mark_dirty(db_key)
+
+    def _remove_record_path(self, db_key, path):
+        """將路徑從紀錄中移除"""
+        paths = self.db_data[db_key]["paths"]
+        if path in paths:
+            paths.remove(path)
+        if self.path_index.get(path) == db_key:
+            del self.path_index[path]
+        self._mark_dirty(db_key)
 
     def merge_subfolder_tags(self):
         """合併子資料夾的標籤資訊到上層資料夾"""
@@ -571,24 +649,89 @@ class FileManager:
         self.db_data.update(new_data)
 
     def save_db(self):
-        """保存資料庫，包括標籤顏色信息"""
-        data = {
-            'files': self.db_data,
-            'tag_colors': self.tag_colors,
-            'tag_color_timestamps': self.tag_color_timestamps
-        }
-        with open(self.db_file, 'w', encoding='utf-8') as file:
-            json.dump(data, file, indent=4, ensure_ascii=False)
+        """保存資料庫，包括標籤顏色信息
+        
+        只記錄需要寫入的紀錄並通知背景執行緒，短時間內的多次呼叫合併為一次寫入。
+        """
+        with self.save_lock:
+            if self.dirty_keys is None or self.pending_keys is None:
+                self.pending_keys = None
+            else:
+                self.pending_keys |= self.dirty_keys
+            self.dirty_keys = set()
+            self.save_requested = True
+        self.saver.request()
+
+    def save_file_state(self):
+        """要求儲存資料夾快照與檔案標識緩存，與 save_db 一樣由背景執行緒合併寫入"""
+        with self.save_lock:
+            self.file_state_requested = True
+        self.saver.request()
+
+    def flush_pending(self):
+        """寫入所有等待中的變動：先寫快照與緩存，再寫資料庫"""
+        with self.save_lock:
+            file_state, self.file_state_requested = self.file_state_requested, False
+        if file_state:
+            self.snapshot.save()
+            self.hash_cache.save()
+        self.flush_db()
+
+    def flush_db(self):
+        """將等待中的變動寫入資料庫（由背景寫入執行緒或關閉程式時呼叫）
+        
+        不取得 self.lock（掃描期間一直持有），只在 save_lock 下複製紀錄。
+        複製時紀錄可能正被其他執行緒修改，但每次修改完成後才標記該紀錄，下一次寫入時即會更新。
+        """
+        with self.save_lock:
+            if not self.save_requested:
+                return
+            keys = self.pending_keys
+            self.pending_keys = set()
+            self.save_requested = False
+            # 複製需要寫入的紀錄，寫入期間不阻擋其他操作；dict() 一次複製，不受同時新增或刪除紀錄影響
+            db_data = dict(self.db_data)
+            source = db_data if keys is None else {key: db_data[key] for key in keys if key in db_data}
+            files = {key: {
+                "tags": list(record["tags"]),
+                "note": record.get("note", ""),
+                "hash": record.get("hash"),
+                "paths": list(record.get("paths", [])),
+                "name": record.get("name")
+            } for key, record in source.items()}
+            tag_colors = dict(self.tag_colors)
+            tag_color_timestamps = dict(self.tag_color_timestamps)
+        
+        try:
+            self.storage.save(files, tag_colors, tag_color_timestamps, keys)
+        except Exception:
+            # 寫入失敗時保留變動，下次再寫入
+            with self.save_lock:
+                if keys is None or self.pending_keys is None:
+                    self.pending_keys = None
+                else:
+                    self.pending_keys |= keys
+                self.save_requested = True
+            raise
+
+    def close(self):
+        """關閉程式前寫入所有尚未儲存的資料"""
+        self.saver.close()
+        self.snapshot.save()
+        self.hash_cache.save()
+
+    def export_json(self, json_file):
+        """以 JSON 格式（原 file_tags.json 格式）匯出整個資料庫"""
+        write_json_db(json_file, self.db_data, self.tag_colors, self.tag_color_timestamps)
 
     def create_restore_point(self):
-        """创建数据文件的备份"""
-        if os.path.exists(self.db_file):
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            # 只使用文件名而不是完整路径
-            backup_filename = f'{timestamp}_file_tags.json'
-            backup_file = os.path.join(self.backup_dir, backup_filename)
-            shutil.copy2(self.db_file, backup_file)
-            self.cleanup_restore_points()
+        """创建数据文件的备份（JSON 格式）"""
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        # 只使用文件名而不是完整路径
+        backup_filename = f'{timestamp}_file_tags.json'
+        backup_file = os.path.join(self.backup_dir, backup_filename)
+        self.export_json(backup_file)
+        self.cleanup_restore_points()
 
     def cleanup_restore_points(self):
         """清理还原点，只保留最新的50个"""
@@ -628,8 +771,9 @@ class FileManager:
         if not os.path.exists(backup_file):
             raise FileNotFoundError(f"备份文件不存在: {backup_file}")
             
-        shutil.copy2(backup_file, self.db_file)
-        self.load_db()
+        self.db_data, self.tag_colors, self.tag_color_timestamps = JsonStorage(backup_file).load()
+        self.rebuild_index()
+        self.save_db()
 
     def get_restore_points(self):
         """获取所有可用的还原点"""
@@ -641,124 +785,302 @@ class FileManager:
                     backups.append(backup)
         return sorted(backups, reverse=True)  # 按文件名排序，最新的在前
 
-    def set_folder_paths(self, folder_paths):
-        """設置要監控的資料夾路徑，更新檔案列表和雜湊值"""
-        self.folder_paths = [os.path.abspath(path) for path in folder_paths]
-        self.files_tags = {}
+    def set_folder_paths(self, folder_paths, full_scan=False):
+        """設置要監控的資料夾路徑，以增量方式更新檔案列表和雜湊值
+        
+        只有修改時間改變的資料夾會重新列出，只有狀態改變的檔案會重新計算檔案標識；
+        full_scan 為 True 時捨棄快照，重新掃描所有檔案。
+        """
+        with self.lock:
+            self.folder_paths = [os.path.abspath(path) for path in folder_paths]
+            if full_scan:
+                self.snapshot.clear()
+        
+            result = self.snapshot.scan([path for path in self.folder_paths if os.path.exists(path)])
+            self.files_tags = {}
+            # 以新的索引取代，不清空舊索引（見 _new_tag_index）
+            self.tag_index = self._new_tag_index()
+
+            # 未改變的檔案沿用快照中的檔案標識，不需讀取檔案內容
+            for full_path, file_name, file_hash in result.unchanged:
+                current_hash = self._scan_file(full_path, file_name, file_hash)
+                if current_hash != file_hash:
+                    self.snapshot.set_hash(full_path, current_hash)
+        
+            # 以檔案身分（裝置 + inode + 大小 + 修改時間）辨識被搬移或重新命名的檔案
+            moved_from = {}
+            for full_path, info in result.removed:
+                identity = file_identity(info)
+                if identity is not None:
+                    moved_from[identity] = (full_path, info[2])
+                else:
+                    self._forget_path(full_path)
+            
+            # 新增或狀態改變的檔案重新比對
+            to_hash = []
+            for full_path, file_name, info, stat in result.changed:
+                identity = file_identity(info)
+                source = moved_from.pop(identity, None) if identity is not None else None
+                if source is not None:
+                    # 搬移的檔案沿用原紀錄與檔案標識，不需讀取內容
+                    old_path, file_hash = source
+                    self._move_record_path(old_path, full_path)
+                    self.hash_cache.move(old_path, full_path)
+                    current_hash = self._scan_file(full_path, file_name, file_hash)
+                    self.snapshot.set_hash(full_path, current_hash)
+                else:
+                    to_hash.append((full_path, stat, file_name))
+            
+            # 只有資料庫中有相同檔名紀錄的檔案才需要計算檔案標識
+            for full_path, _, file_name in to_hash:
+                if file_name not in self.name_index:
+                    self._scan_file(full_path, file_name)
+            
+            # 以執行緒池並行讀取檔案（沿用掃描時的檔案狀態），結果在目前執行緒逐一合併
+            jobs = (job for job in to_hash if job[2] in self.name_index)
+            for (full_path, _, file_name), file_hash in fingerprint_files(jobs, self.calculate_file_hash, self.hash_workers):
+                if file_hash:
+                    self._scan_file(full_path, file_name, file_hash)
+                self.snapshot.set_hash(full_path, file_hash)
+            
+            # 真正被刪除的檔案
+            for old_path, _ in moved_from.values():
+                self._forget_path(old_path)
+
+            # 清理沒有標籤和備註的紀錄
+            for key in list(self.db_data.keys()):
+                if not self.db_data[key]["tags"] and not self.db_data[key]["note"]:
+                    self._delete_record(key)
+
+            # 儲存更新後的資料庫和快照，並清理已不存在檔案的緩存
+            self.save_db()
+            self.snapshot.save()
+            self.clean_cache()
+            # 在背景執行緒預先排序路徑並壓縮索引，第一次翻頁時不必等待
+            self.tag_index.ordered_paths()
+            self.tag_index.compact()
 
-        # 掃描所有資料夾中的檔案
-        for folder_path in self.folder_paths:
-            if not os.path.exists(folder_path):
-                continue
-            
-            for root, _, files in os.walk(folder_path):
-                for file in files:
-                    full_path = os.path.abspath(os.path.join(root, file))
-                    file_name = os.path.basename(full_path)
-                    
-                    # 檢查資料庫中是否有相同檔名的記錄
-                    name_exists = False
-                    for db_key, info in self.db_data.items():
-                        if info.get("name") == file_name:
-                            name_exists = True
-                            break
-                    
-                    # 如果檔案名稱不存在於資料庫中，直接加入檔案列表
-                    if not name_exists:
-                        self.files_tags[full_path] = {
-                            "tags": [],
-                            "note": "",
-                            "hash": None,
-                            "name": file_name
-                        }
-                        continue
-                    
-                    current_hash = self.calculate_file_hash(full_path)
-                    if not current_hash:
-                        continue
-                    
-                    # 使用檔案名稱和雜湊值組合作為鍵值
-                    current_db_key = f"{file_name}_{current_hash}"
-                    
-                    # 檢查是否存在相同檔名但不同雜湊值的紀錄
-                    found_old_record = False
-                    for db_key in list(self.db_data.keys()):
-                        if file_name in db_key and full_path in self.db_data[db_key]["paths"]:
-                            if db_key != current_db_key:  # 雜湊值不同
-                                # 從舊紀錄中移除當前路徑
-                                self.db_data[db_key]["paths"].remove(full_path)
-                                
-                                # 如果舊紀錄沒有其他路徑且有標籤或備註，則複製到新紀錄
-                                if (not self.db_data[db_key]["paths"] and 
-                                    (self.db_data[db_key]["tags"] or self.db_data[db_key]["note"])):
-                                    # 建立新紀錄，沿用舊紀錄的標籤和備註
-                                    self.db_data[current_db_key] = {
-                                        "tags": self.db_data[db_key]["tags"].copy(),
-                                        "note": self.db_data[db_key]["note"],
-                                        "hash": current_hash,
-                                        "paths": [full_path],
-                                        "name": file_name
-                                    }
-                                    # 如果舊紀錄沒有其他路徑，可以刪除
-                                    del self.db_data[db_key]
-                                else:
-                                    # 如果舊紀錄有標籤或備註，建立新紀錄
-                                    if self.db_data[db_key]["tags"] or self.db_data[db_key]["note"]:
-                                        self.db_data[current_db_key] = {
-                                            "tags": self.db_data[db_key]["tags"].copy(),
-                                            "note": self.db_data[db_key]["note"],
-                                            "hash": current_hash,
-                                            "paths": [full_path],
-                                            "name": file_name
-                                        }
-                            
-                            found_old_record = True
-                            break
-                    
-                    # 如果沒有找到舊紀錄，則檢查是否有相同雜湊值的紀錄
-                    if not found_old_record:
-                        if current_db_key in self.db_data:
-                            if full_path not in self.db_data[current_db_key]["paths"]:
-                                self.db_data[current_db_key]["paths"].append(full_path)
-                                self.db_data[current_db_key]["hash"] = current_hash
-                                self.db_data[current_db_key]["name"] = file_name
-                        else:
-                            # 建立新記錄
-                            self.db_data[current_db_key] = {
-                                "tags": [],
-                                "note": "",
-                                "hash": current_hash,
-                                "paths": [full_path],
-                                "name": file_name
-                            }
-                    
-                    # 更新 files_tags
+        # 在最後加入更新監控的程式碼
+        if hasattr(self, 'event_handler') and self.event_handler:
+            self.start_monitoring(self.event_handler.callback)
+
+    def _scan_file(self, full_path, file_name, current_hash=None, stat=None):
+        """比對單一檔案與資料庫紀錄，並更新 files_tags
+        
+        已知檔案標識時直接使用，否則以 stat（若有）重新計算。返回檔案標識。
+        """
+        # 資料庫中沒有相同檔名的記錄，直接加入檔案列表
+        if file_name not in self.name_index:
+            self.files_tags[full_path] = {
+                "tags": [],
+                "note": "",
+                "hash": None,
+                "name": file_name
+            }
+            self.tag_index.update(full_path, ())
+            return current_hash
+        
+        if current_hash and fingerprint_code(current_hash) != self.fingerprint.code:
+            current_hash = None  # 以舊策略計算的檔案標識需重新計算
+        if not current_hash:
+            current_hash = self.calculate_file_hash(full_path, stat)
+        if not current_hash:
+            return None
+        
+        # 使用檔案名稱和雜湊值組合作為鍵值
+        current_db_key = f"{file_name}_{current_hash}"
+        
+        # 透過路徑索引檢查是否存在相同檔名但不同雜湊值的紀錄
+        db_key = self.path_index.get(full_path)
+        if db_key is not None and file_name in db_key:
+            if db_key != current_db_key:  # 雜湊值不同
+                old_record = self.db_data[db_key]
+                # 從舊紀錄中移除當前路徑
+                self._remove_record_path(db_key, full_path)
+                
+                # 如果舊紀錄有標籤或備註，建立新紀錄沿用舊紀錄的標籤和備註
+                if old_record["tags"] or old_record["note"]:
                     if current_db_key in self.db_data:
-                        self.files_tags[full_path] = {
-                            "tags": self.db_data[current_db_key]["tags"],
-                            "note": self.db_data[current_db_key]["note"],
-                            "hash": current_hash,
-                            "name": file_name
-                        }
+                        # 相同內容的其他路徑已建立新紀錄
+                        self._add_record_path(current_db_key, full_path)
                     else:
-                        self.files_tags[full_path] = {
-                            "tags": [],
-                            "note": "",
+                        self._put_record(current_db_key, {
+                            "tags": old_record["tags"].copy(),
+                            "note": old_record["note"],
                             "hash": current_hash,
+                            "paths": [full_path],
                             "name": file_name
-                        }
+                        })
+                    # 如果舊紀錄沒有其他路徑，可以刪除
+                    if not old_record["paths"]:
+                        self._delete_record(db_key)
+        elif current_db_key in self.db_data:
+            # 有相同雜湊值的紀錄
+            self._add_record_path(current_db_key, full_path)
+            self.db_data[current_db_key]["hash"] = current_hash
+            self.db_data[current_db_key]["name"] = file_name
+        elif self._migrate_record(full_path, file_name, current_hash, stat):
+            # 以舊策略計算檔案標識的紀錄已轉換為目前的鍵值
+            pass
+        else:
+            # 建立新記錄
+            self._put_record(current_db_key, {
+                "tags": [],
+                "note": "",
+                "hash": current_hash,
+                "paths": [full_path],
+                "name": file_name
+            })
+        
+        # 更新 files_tags
+        if current_db_key in self.db_data:
+            self.files_tags[full_path] = {
+                "tags": self.db_data[current_db_key]["tags"],
+                "note": self.db_data[current_db_key]["note"],
+                "hash": current_hash,
+                "name": file_name
+            }
+        else:
+            self.files_tags[full_path] = {
+                "tags": [],
+                "note": "",
+                "hash": current_hash,
+                "name": file_name
+            }
+        self.tag_index.update(full_path, self.files_tags[full_path]["tags"])
+        return current_hash
 
-        # 清理沒有標籤和備註的紀錄
-        for key in list(self.db_data.keys()):
-            if not self.db_data[key]["tags"] and not self.db_data[key]["note"]:
-                del self.db_data[key]
+    def apply_file_events(self, events):
+        """將檔案監控事件逐一套用到 files_tags 和 db_data，不重新掃描整個資料夾
+        
+        events 為 (事件類型, 來源路徑, 目的路徑, 是否為資料夾) 的列表。
+        返回 False 表示有無法逐一套用的事件（資料夾新增、刪除或搬移），需要重新掃描。
+        """
+        needs_rescan = False
+        with self.lock:
+            for event_type, src_path, dest_path, is_directory in events:
+                if is_directory:
+                    # 資料夾的修改事件只代表子項目改變，子項目本身會有各自的事件
+                    if event_type != 'modified':
+                        needs_rescan = True
+                    continue
+                
+                if event_type in ('created', 'modified'):
+                    self._apply_file_changed(os.path.abspath(src_path))
+                elif event_type == 'deleted':
+                    self._apply_file_deleted(os.path.abspath(src_path))
+                elif event_type == 'moved':
+                    self._apply_file_moved(os.path.abspath(src_path), os.path.abspath(dest_path))
+            
+            # 監控事件可能短時間內連續到達，與資料庫一起交由背景執行緒合併寫入
+            self.tag_index.compact()
+            self.save_db()
+            self.save_file_state()
+        return not needs_rescan
 
-        # 儲存更新後的資料庫
-        self.save_db()
+    def is_in_folders(self, file_path):
+        """檢查路徑是否位於監控的資料夾中"""
+        file_path = os.path.normcase(file_path)
+        for folder_path in self.folder_paths:
+            folder_path = os.path.normcase(folder_path)
+            if file_path == folder_path or file_path.startswith(folder_path.rstrip(os.sep) + os.sep):
+                return True
+        return False
 
-        # 在最後加入更新監控的程式碼
-        if hasattr(self, 'event_handler') and self.event_handler:
-            self.start_monitoring(self.event_handler.callback)
+    def _apply_file_changed(self, file_path):
+        """套用單一檔案的新增或修改事件"""
+        if not self.is_in_folders(file_path):
+            return
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            # 檔案已被刪除（例如暫存檔）
+            self._apply_file_deleted(file_path)
+            return
+        
+        file_name = os.path.basename(file_path)
+        if file_path in self.files_tags:
+            # 內容可能已改變，重新比對
+            del self.files_tags[file_path]
+            self.tag_index.remove(file_path)
+        file_hash = self._scan_file(file_path, file_name, stat=stat)
+        self.snapshot.update_file(file_path, stat, file_hash)
+
+    def _apply_file_deleted(self, file_path):
+        """套用單一檔案的刪除事件，紀錄保留以便檔案重新出現時沿用標籤"""
+        self.files_tags.pop(file_path, None)
+        self.tag_index.remove(file_path)
+        self._forget_path(file_path)
+        self.snapshot.remove_file(file_path)
+        self.hash_cache.discard(file_path)
+
+    def _apply_file_moved(self, src_path, dest_path):
+        """套用單一檔案的搬移或重新命名事件，標籤與備註跟隨檔案，不需讀取內容"""
+        if not self.is_in_folders(dest_path):
+            self._apply_file_deleted(src_path)
+            return
+        
+        entry = self.files_tags.pop(src_path, None)
+        self.tag_index.remove(src_path)
+        if entry is None:
+            # 從監控範圍外搬入的檔案
+            self._apply_file_changed(dest_path)
+            return
+        
+        file_hash = entry["hash"] or self.snapshot.get_hash(src_path)
+        self._move_record_path(src_path, dest_path)
+        self.snapshot.move_file(src_path, dest_path)
+        self.hash_cache.move(src_path, dest_path)
+        file_hash = self._scan_file(dest_path, os.path.basename(dest_path), file_hash)
+        self.snapshot.set_hash(dest_path, file_hash)
+
+    def _forget_path(self, file_path):
+        """將已不存在的路徑從紀錄中移除"""
+        db_key = self.path_index.get(file_path)
+        if db_key is not None:
+            self._remove_record_path(db_key, file_path)
+
+    def _move_record_path(self, old_path, new_path):
+        """將紀錄從舊路徑改指向新路徑，檔名改變時以新檔名重新建立鍵值"""
+        db_key = self.path_index.get(old_path)
+        if db_key is None:
+            return
+        
+        record = self.db_data[db_key]
+        new_name = os.path.basename(new_path)
+        new_key = f"{new_name}_{record['hash']}"
+        self._remove_record_path(db_key, old_path)
+        
+        if new_key == db_key:
+            self._add_record_path(db_key, new_path)
+            return
+        
+        if record["paths"]:
+            # 舊紀錄仍有其他路徑（相同內容的副本），為新路徑複製標籤和備註
+            tags = record["tags"].copy()
+        else:
+            # 整筆紀錄跟隨檔案搬移
+            tags = record["tags"]
+            self._delete_record(db_key)
+        
+        if new_key in self.db_data:
+            existing = self.db_data[new_key]
+            for tag in tags:
+                if tag not in existing["tags"]:
+                    existing["tags"].append(tag)
+            if not existing["note"]:
+                existing["note"] = record["note"]
+            self._add_record_path(new_key, new_path)
+            # 合併的標籤也屬於共用此紀錄的其他路徑
+            self._index_tags(new_path)
+        else:
+            self._put_record(new_key, {
+                "tags": tags,
+                "note": record["note"],
+                "hash": record["hash"],
+                "paths": [new_path],
+                "name": new_name
+            })
 
     def refresh_db(self):
         """只清理已刪除的檔案記錄"""
@@ -768,50 +1090,98 @@ class FileManager:
         # 檢查資料庫中的檔案是
         for file_path in list(self.db_data.keys()):
             if not os.path.exists(file_path):
-                del self.db_data[file_path]
+                self._delete_record(file_path)
 
         self.save_db()
 
     def add_tag(self, file_path, tag):
         if tag.strip():
-            file_name = os.path.basename(file_path)
             current_hash = self.calculate_file_hash(file_path)
             if not current_hash:
                 return
             
-            db_key = f"{file_name}_{current_hash}"
-            
-            # 確保檔案記錄存在
-            if file_path not in self.files_tags:
-                self.files_tags[file_path] = {
-                    "tags": [],
-                    "note": "",
-                    "hash": current_hash,
-                    "name": file_name  # 確保記錄檔案名稱
-                }
-            
-            # 新增標籤
-            if tag not in self.files_tags[file_path]["tags"]:
-                self.files_tags[file_path]["tags"].append(tag)
-                
-                # 更新資料庫
-                if db_key not in self.db_data:
-                    self.db_data[db_key] = {
-                        "tags": [tag],
-                        "note": "",
-                        "hash": current_hash,
-                        "paths": [file_path],
-                        "name": file_name  # 確保記錄檔案名稱
-                    }
-                else:
-                    if tag not in self.db_data[db_key]["tags"]:
-                        self.db_data[db_key]["tags"].append(tag)
-                    # 確保雜湊值和檔案名稱是最新的
-                    self.db_data[db_key]["hash"] = current_hash
-                    self.db_data[db_key]["name"] = file_name
-                
+            if self._add_tag(file_path, tag, current_hash):
                 self.save_db()
 
+    def _add_tag(self, file_path, tag, current_hash):
+        """以已計算的檔案標識為檔案加上標籤，不儲存資料庫，返回是否新增了標籤"""
+        file_name = os.path.basename(file_path)
+        db_key = f"{file_name}_{current_hash}"
+        if db_key not in self.db_data:
+            self._migrate_record(file_path, file_name, current_hash)
+        
+        # 確保檔案記錄存在
+        if file_path not in self.files_tags:
+            self.files_tags[file_path] = {
+                "tags": [],
+                "note": "",
+                "hash": current_hash,
+                "name": file_name  # 確保記錄檔案名稱
+            }
+        # 記錄檔案標識，搬移或重新命名時可直接沿用
+        self.files_tags[file_path]["hash"] = current_hash
+        self.snapshot.set_hash(file_path, current_hash)
+        
+        # 新增標籤
+        if tag in self.files_tags[file_path]["tags"]:
+            return False
+        self.files_tags[file_path]["tags"].append(tag)
+        self._index_tags(file_path)
+        
+        # 更新資料庫
+        if db_key not in self.db_data:
+            self._put_record(db_key, {
+                "tags": [tag],
+                "note": "",
+                "hash": current_hash,
+                "paths": [file_path],
+                "name": file_name  # 確保記錄檔案名稱
+            })
+        else:
+            if tag not in self.db_data[db_key]["tags"]:
+                self.db_data[db_key]["tags"].append(tag)
+            # 確保雜湊值和檔案名稱是最新的
+            self.db_data[db_key]["hash"] = current_hash
+            self.db_data[db_key]["name"] = file_name
+            self._add_record_path(db_key, file_path)
+        return True
+
+    def tag_paths(self, paths, tag):
+        """為多個檔案（例如拖放的檔案）加上同一個標籤，返回新加上標籤的檔案路徑
+        
+        不存在的檔案與原本已有該標籤的檔案不列入結果。不在監控資料夾中的檔案，其所在資料夾一併加入後只增量掃描一次；
+        檔案標識以執行緒池並行計算（未改變的檔案直接取自緩存），最後只要求儲存一次資料庫。
+        """
+        if not tag.strip():
+            return []
+        paths = list(dict.fromkeys(os.path.abspath(path) for path in paths if os.path.isfile(path)))
+        
+        # 收集新的資料夾，已被其他新資料夾包含的子資料夾不需重複加入
+        new_roots = []
+        for path in paths:
+            if not self.is_in_folders(path):
+                folder_path = os.path.dirname(path)
+                if folder_path not in new_roots:
+                    new_roots.append(folder_path)
+        if new_roots:
+            new_roots.sort(key=len)
+            roots = []
+            for folder_path in new_roots:
+                if not any(os.path.normcase(folder_path).startswith(os.path.normcase(root.rstrip(os.sep) + os.sep))
+                           for root in roots):
+                    roots.append(folder_path)
+            self.set_folder_paths(self.folder_paths + roots)
+        
+        tagged = []
+        with self.lock:
+            jobs = ((path, None) for path in paths)
+            for (file_path, _), current_hash in fingerprint_files(jobs, self.calculate_file_hash, self.hash_workers):
+                if current_hash and self._add_tag(file_path, tag, current_hash):
+                    tagged.append(file_path)
+            self.tag_index.compact()
+            self.save_db()
+        return tagged
+
     def remove_tag(self, file_path, tag):
         file_name = os.path.basename(file_path)
         current_hash = self.calculate_file_hash(file_path)
@@ -819,18 +1189,23 @@ class FileManager:
             return
         
         db_key = f"{file_name}_{current_hash}"
+        if db_key not in self.db_data:
+            self._migrate_record(file_path, file_name, current_hash)
         
         # 從 files_tags 中移除標籤
         if file_path in self.files_tags and tag in self.files_tags[file_path]["tags"]:
             self.files_tags[file_path]["tags"].remove(tag)
+            self._index_tags(file_path)
             
-            # 從 db_data 中移除標籤
-            if db_key in self.db_data and tag in self.db_data[db_key]["tags"]:
-                self.db_data[db_key]["tags"].remove(tag)
-                
+            # 從 db_data 中移除標籤（紀錄可能與 files_tags 共用同一個標籤列表，已經移除）
+            if db_key in self.db_data:
+                if tag in self.db_data[db_key]["tags"]:
+                    self.db_data[db_key]["tags"].remove(tag)
+                self._mark_dirty(db_key)
+
                 # 如果檔案沒有任何標籤和備註，從資料庫中移除
                 if not self.db_data[db_key]["tags"] and not self.db_data[db_key]["note"]:
-                    del self.db_data[db_key]
+                    self._delete_record(db_key)
             
             self.save_db()
 
@@ -844,6 +1219,8 @@ class FileManager:
             return
         
         db_key = f"{file_name}_{current_hash}"
+        if db_key not in self.db_data:
+            self._migrate_record(file_path, file_name, current_hash)
         
         # 確保檔案記錄存在
         if file_path not in self.files_tags:
@@ -853,115 +1230,206 @@ class FileManager:
                 "hash": current_hash,
                 "name": file_name  # 確保記錄檔案名稱
             }
+        self.files_tags[file_path]["hash"] = current_hash
+        self.snapshot.set_hash(file_path, current_hash)
         
         # 設置備註
         self.files_tags[file_path]["note"] = note
         self.files_tags[file_path]["name"] = file_name  # 更新檔案名稱
+        self._index_tags(file_path)
         
         # 更新資料庫
         if note or (db_key in self.db_data and self.db_data[db_key]["tags"]):
             if db_key not in self.db_data:
-                self.db_data[db_key] = {
+                self._put_record(db_key, {
                     "tags": [],
                     "note": note,
                     "hash": current_hash,
                     "paths": [file_path],
                     "name": file_name  # 確保記錄檔案名稱
-                }
+                })
             else:
                 self.db_data[db_key]["note"] = note
                 self.db_data[db_key]["name"] = file_name  # 更新檔案名稱
+                self._add_record_path(db_key, file_path)
         elif db_key in self.db_data and not self.db_data[db_key]["tags"]:
             # 如果沒有備註也沒有標籤，從資料庫中移除
-            del self.db_data[db_key]
+            self._delete_record(db_key)
         
         self.save_db()
 
     def get_note(self, file_path):
+        """返回檔案的備註
+        
+        由路徑索引直接取得紀錄，不需讀取檔案計算標識（滑鼠移動時的提示會頻繁呼叫）；
+        只有不在檔案列表中的路徑才計算檔案標識查詢資料庫。
+        """
+        db_key = self.path_index.get(file_path)
+        if db_key is not None:
+            return self.db_data.get(db_key, {}).get("note", "")
+        info = self.files_tags.get(file_path)
+        if info is not None:
+            # 已掃描但沒有資料庫紀錄的檔案
+            return info.get("note", "")
+
         file_name = os.path.basename(file_path)
         current_hash = self.calculate_file_hash(file_path)
         if not current_hash:
             return ""
         
         db_key = f"{file_name}_{current_hash}"
+        if db_key not in self.db_data:
+            self._migrate_record(file_path, file_name, current_hash)
         return self.db_data.get(db_key, {}).get("note", "")
 
-    def search_by_tags(self, tags):
+    # 以下查詢在主線程執行，掃描與監控執行緒可能同時更新索引：
+    # 先取得目前的索引，計算期間持有索引的 lock（不使用 self.lock，掃描期間會一直持有）
+
+    def search_by_tags(self, tags, file_type=None):
+        """返回同時含有所有指定標籤的檔案（QueryResult），file_type 為副檔名（例如 ".jpg"）時只返回該類型的檔案"""
+        index = self.tag_index
+        with index.lock:
+            return QueryResult(index, self._tag_ids(index, tags, file_type))
+
+    def _tag_ids(self, index, tags, file_type):
         if not tags:
-            # 返回所有檔案的全路徑，使用字典的副本
-            return sorted(list(self.files_tags.keys()))
+            if file_type is not None:
+                return index.search([], file_type)
+            # 返回所有檔案
+            return index.all_ids()
             
         # 將標籤字串分割成列表
         tags_list = [tag.strip() for tag in tags.split(',')]
         
-        # 使用字典的副本進行遍歷
-        files_tags_copy = self.files_tags.copy()
-        
-        # 找出同時包含所有指定標籤的檔案
-        matching_files = []
-        for file_path, info in files_tags_copy.items():
-            file_tags = set(info.get("tags", []))
-            # 檢查檔案是否包含所有指定的標籤
-            if all(tag in file_tags for tag in tags_list):
-                matching_files.append(file_path)
+        # 以標籤反向索引取交集，找出同時包含所有指定標籤的檔案
+        return index.search(tags_list, file_type)
+
+    def query(self, expression):
+        """以查詢語法搜尋檔案，例如 (raw OR edited) AND client-x NOT archived ext:jpg
         
-        return sorted(matching_files)
+        返回符合的檔案（QueryResult），語法錯誤時拋出 QuerySyntaxError。
+        """
+        node = parse_query(expression)
+        index = self.tag_index
+        with index.lock:
+            return QueryResult(index, self._query_ids(index, node))
+
+    def _query_ids(self, index, node):
+        # 單一標籤或副檔名時查詢直接返回索引內的集合，複製後才離開 lock
+        return index.copy_ids(QueryPlanner(index).execute(node))
+
+    def search_file_names(self, text):
+        """返回檔名包含 text（不分大小寫）的檔案（QueryResult），候選檔案由檔名片段索引取得"""
+        index = self.tag_index
+        with index.lock:
+            return QueryResult(index, index.search_name(text))
+
+    def list_untagged_files(self, file_type=None):
+        """返回沒有標籤的檔案（QueryResult），可指定副檔名"""
+        index = self.tag_index
+        with index.lock:
+            return QueryResult(index, index.untagged(file_type))
+
+    def search_text(self, text):
+        """根據搜尋框文字返回符合的檔案（QueryResult）
+        
+        使用查詢語法（AND / OR / NOT、ext:、name:）時以標籤索引查詢，
+        否則比對檔名；查詢語法不完整時（例如輸入到一半）同樣比對檔名。
+        """
+        index = self.tag_index
+        with index.lock:
+            return QueryResult(index, self._text_ids(index, text))
 
-    def list_untagged_files(self):
-        """返回沒有標籤的檔案的全路徑"""
-        untagged_files = []
-        # 使用字典的副本進行遍歷
-        files_tags_copy = self.files_tags.copy()
-        for file_path, info in files_tags_copy.items():
-            # 確保 tags 存在且為空列表
-            tags = info.get("tags", [])
-            if not tags:
-                untagged_files.append(file_path)
+    def _text_ids(self, index, text):
+        if is_query(text):
+            try:
+                return self._query_ids(index, parse_query(text))
+            except QuerySyntaxError:
+                pass
+        return index.search_name(text)
+
+    def find_files(self, tags=None, file_type=None, search_text="", untagged=False):
+        """返回檔案列表要顯示的檔案（QueryResult）：選取的標籤（或未標籤檔案）、副檔名與搜尋文字的交集
         
-        return sorted(untagged_files)
+        結果以 (標籤, 副檔名, 搜尋文字, 索引版本) 為鍵保留在 LRU 快取中，
+        重新選取最近看過的標籤時直接取用；索引有任何變更時版本遞增，舊結果隨之失效。
+        """
+        search_text = (search_text or "").strip()
+        if untagged:
+            tags_key = None
+        else:
+            # 標籤順序不影響結果
+            tags_key = tuple(sorted({tag.strip() for tag in tags.split(',')})) if tags else ()
+        index = self.tag_index
+        key = (tags_key, file_type, search_text, index.generation)
+        result = self.query_cache.get(key)
+        if result is not None:
+            return result
+
+        # 整個查詢使用同一個索引，掃描途中換上新索引時不會混用兩者的檔案 ID
+        with index.lock:
+            if untagged:
+                ids = index.untagged(file_type)
+            else:
+                ids = self._tag_ids(index, tags, file_type)
+            if search_text:
+                ids = ids & self._text_ids(index, search_text)
+        result = QueryResult(index, ids)
+        self.query_cache.put(key, result)
+        return result
 
     def get_all_used_tags(self):
-        all_tags = set()
-        # 使用字典的副本進行遍歷
-        files_tags_copy = self.files_tags.copy()
-        for info in files_tags_copy.values():
-            all_tags.update(info.get("tags", []))
-        return sorted(all_tags)
+        index = self.tag_index
+        with index.lock:
+            return sorted(index.used_tags())
+
+    def get_tag_view(self):
+        """返回標籤列表的顯示順序 ((標籤, 顏色), ...)，沒有自訂顏色的標籤顏色為 None
+        
+        有顏色的標籤按顏色修改時間排序（最新的在前），其餘標籤依名稱排序。
+        結果會快取，標籤索引或標籤顏色變更後才重新計算。
+        """
+        key = (self.tag_index.generation, self.tag_color_generation, self.default_color)
+        if key != self.tag_view_key:
+            # 將標籤分為兩組：有顏色的和沒有顏色的
+            colored_tags = []
+            normal_tags = []
+            for tag in self.get_all_used_tags():
+                if self.get_tag_color(tag) != self.default_color:
+                    colored_tags.append(tag)
+                else:
+                    normal_tags.append(tag)
+            
+            # 對有顏色的標籤按修改時間排序（最新的在前）
+            colored_tags.sort(key=self.get_tag_color_timestamp, reverse=True)
+            
+            self.tag_view = tuple([(tag, self.get_tag_color(tag)) for tag in colored_tags] +
+                                  [(tag, None) for tag in normal_tags])
+            self.tag_view_key = key
+        return self.tag_view
 
     def get_all_file_types(self):
-        """返回所有檔案的擴展名，已排序並去重"""
-        file_types = set()
-        # 使用字典的副本進行遍歷
-        files_tags_copy = self.files_tags.copy()
-        for file_path in files_tags_copy.keys():
-            _, ext = os.path.splitext(file_path)
-            if ext:
-                file_types.add(ext.lower())
-        return sorted(file_types)
+        """返回所有檔案的擴展名，已排序並去重（由副檔名索引取得）"""
+        index = self.tag_index
+        with index.lock:
+            return sorted(index.file_types())
 
     def rename_tag(self, old_tag, new_tag, merge=False):
+        if old_tag == new_tag:
+            return
+        
         # 保存旧标签的颜色
         old_tag_color = self.get_tag_color(old_tag)
         old_tag_color_timestamp = self.get_tag_color_timestamp(old_tag)
         
-        if merge:
-            for file_path, info in self.files_tags.items():
-                if old_tag in info["tags"]:
-                    index = info["tags"].index(old_tag)
-                    info["tags"][index] = new_tag
-                    if new_tag not in info["tags"]:
-                        self.db_data[file_path]["tags"].append(new_tag)
-        else:
-            for file_path, info in self.files_tags.items():
-                if old_tag in info["tags"]:
-                    index = info["tags"].index(old_tag)
-                    info["tags"][index] = new_tag
-                    # 同步更新 db_data
-                    if file_path in self.db_data:
-                        tags = self.db_data[file_path]["tags"]
-                        if old_tag in tags:
-                            index = tags.index(old_tag)
-                            tags[index] = new_tag
+        # 新標籤已存在時合併，避免同一檔案出現重複標籤
+        # 先更新 db_data 以標記變動的紀錄（紀錄與 files_tags 可能共用同一個標籤列表）
+        for db_key, record in self.db_data.items():
+            if self._replace_tag(record["tags"], old_tag, new_tag):
+                self._mark_dirty(db_key)
+        for info in self.files_tags.values():
+            self._replace_tag(info["tags"], old_tag, new_tag)
+        self.tag_index.rename_tag(old_tag, new_tag)
         
         # 如果旧标签有自定义颜色，将其应用到新标签
         if old_tag_color != self.default_color:
@@ -975,25 +1443,41 @@ class FileManager:
             del self.tag_colors[old_tag]
         if old_tag in self.tag_color_timestamps:
             del self.tag_color_timestamps[old_tag]
+        self.tag_color_generation += 1
         
         self.save_db()
 
     def delete_tag(self, tag):
         """從所有檔案中刪除指定的標籤"""
-        # 先從 files_tags 中移除標籤
-        for file_path, info in self.files_tags.items():
+        # 先從 db_data 中移除標籤，以標記變動的紀錄（紀錄與 files_tags 可能共用同一個標籤列表）
+        for db_key in list(self.db_data.keys()):
+            record = self.db_data[db_key]
+            if tag in record["tags"]:
+                record["tags"].remove(tag)
+                self._mark_dirty(db_key)
+            # 如果檔案沒有任何標籤和備註，從資料庫中移除
+            if not record["tags"] and not record["note"]:
+                self._delete_record(db_key)
+        
+        # 同步更新 files_tags
+        for info in self.files_tags.values():
             if tag in info["tags"]:
                 info["tags"].remove(tag)
-                # 同步更新 db_data
-                if file_path in self.db_data:
-                    if tag in self.db_data[file_path]["tags"]:
-                        self.db_data[file_path]["tags"].remove(tag)
-                    # 如果檔案沒有任何標籤和備註，從資料庫中移除
-                    if not self.db_data[file_path]["tags"] and not self.db_data[file_path]["note"]:
-                        del self.db_data[file_path]
+        self.tag_index.delete_tag(tag)
         
         self.save_db()
 
+    @staticmethod
+    def _replace_tag(tags, old_tag, new_tag):
+        """在標籤列表中以新標籤取代舊標籤，新標籤已存在時只移除舊標籤"""
+        if old_tag not in tags:
+            return False
+        if new_tag in tags:
+            tags.remove(old_tag)
+        else:
+            tags[tags.index(old_tag)] = new_tag
+        return True
+
     # Batch operations
     def add_tags_batch(self, filenames, tags):
         for filename in filenames:
@@ -1035,6 +1519,7 @@ class FileManager:
         """設置標籤的顏色"""
         self.tag_colors[tag] = color
         self.tag_color_timestamps[tag] = datetime.now().timestamp()
+        self.tag_color_generation += 1
         self.save_db()
 
     def get_tag_color(self, tag):
@@ -1102,25 +1587,26 @@ class BackgroundUpdateManager:
         except Exception as e:
             logger.error(f"掃描檔案時出錯: {str(e)}")
     
+    def apply_file_events(self, events):
+        """直接套用檔案監控事件並更新UI，無法逐一套用時改為背景增量掃描"""
+        try:
+            if self.app.file_manager.apply_file_events(events):
+                self.app.after(100, self._update_ui)
+            else:
+                self.queue_update("scan_files", self.app.file_manager.folder_paths)
+        except Exception as e:
+            logger.error(f"套用檔案監控事件時出錯: {str(e)}")
+            self.queue_update("scan_files", self.app.file_manager.folder_paths)
+    
     def _update_ui(self):
         """更新UI元素"""
         try:
             if self.is_updating:
                 return
             
-            # 保存當前選中的檔案
-            selected_items = self.app.file_tree.selection()
-            self.app.selected_paths = []
-            for item in selected_items:
-                try:
-                    file_path = self.app.file_tree.item(item, 'values')[0]
-                    self.app.selected_paths.append(file_path)
-                except:
-                    continue
-                
-            # 批量更新UI
+            # 批量更新UI（檔案列表維持選取與捲動位置）
             self.app.refresh_tag_list()
-            self.app.filter_file_list()  # 改用 filter_file_list 來更新檔案列表
+            self.app.filter_file_list(keep_position=True)  # 改用 filter_file_list 來更新檔案列表
             self.app.update_edit_buttons_state()
         except Exception as e:
             logger.error(f"更新UI時出錯: {str(e)}")
@@ -1153,47 +1639,6 @@ class BackgroundUpdateManager:
         """設置更新狀態"""
         self.is_updating = updating
 
-    def load_files_in_batches(self):
-        """分批載入檔案到Treeview中以保持UI流暢"""
-        if self.is_loading_cancelled:
-            return
-
-        if not hasattr(self, 'all_files') or self.all_files is None:
-            self.all_files = []
-            return
-
-        start = self.current_batch * self.load_batch_size
-        end = min(start + self.load_batch_size, len(self.all_files))
-        batch = self.all_files[start:end]
-
-        # 如果是第一批，清空現有項目
-        if self.current_batch == 0:
-            self.file_tree.delete(*self.file_tree.get_children())
-
-        # 禁用重繪以提高性能
-        self.file_tree.configure(height=1)  # 臨時減少高度以加快插入
-        
-        # 批量插入檔案
-        items_to_insert = []
-        for full_path in batch:
-            file_name = os.path.basename(full_path)
-            items_to_insert.append(('', 'end', file_name, (full_path,)))
-
-        # 使用批量插入
-        for item in items_to_insert:
-            item_id = self.file_tree.insert(item[0], item[1], text=item[2], values=item[3])
-            if hasattr(self, 'selected_paths') and item[3][0] in self.selected_paths:
-                self.file_tree.selection_add(item_id)
-
-        # 恢復正常高度
-        self.file_tree.configure(height=20)  # 或其他適當的高度
-
-        self.current_batch += 1
-        
-        # 如果還有更多檔案要載入，安排下一批
-        if end < len(self.all_files) and not self.is_loading_cancelled:
-            self.after(100, self.load_files_in_batches)  # 增加延遲時間到100ms以減少UI凍結
-
 class SplashScreen(tk.Toplevel):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -1450,9 +1895,9 @@ class BackgroundInitializer:
                     if valid_tags:
                         # 選中這些標籤
                         for tag in valid_tags:
-                            for item in self.app.tag_list.get_children():
-                                if self.app.tag_list.item(item, 'text') == tag:
-                                    self.app.tag_list.selection_add(item)
+                            item = self.app.tag_list_sync.item_id(tag)
+                            if item:
+                                self.app.tag_list.selection_add(item)
                         
                         # 更新檔案列表
                         self.app.update_file_list_by_tag_selection()
@@ -1605,6 +2050,11 @@ class Application(TkinterDnD.Tk):
                     saved_default_color = config.get('default_tag_color')
                     if saved_default_color:
                         self.file_manager.default_color = saved_default_color
+                    # 載入並行計算檔案標識的執行緒數與檔案標識策略
+                    self.file_manager.hash_workers = config.get('hash_workers', self.file_manager.hash_workers)
+                    self.file_manager.set_fingerprint_strategy(config.get('fingerprint_strategy', DEFAULT_FINGERPRINT_STRATEGY))
+                    # 大型資料庫可改用壓縮點陣圖的標籤索引
+                    self.file_manager.set_tag_index_backend(config.get('tag_index', 'set'))
                     # 載入快捷鍵設置
                     hotkey_config = config.get('hotkeys', {})
                     self.hotkey_modifier = hotkey_config.get('modifier', 'Ctrl')
@@ -1728,8 +2178,6 @@ class Application(TkinterDnD.Tk):
         # 6. 初始化其他變數
         self.file_type_var = StringVar(value=self.last_file_type)
         self.intended_selection = None
-        self.current_batch_id = 0
-        self.is_loading_cancelled = False
         
         # 7. 初始化後台更新管理器
         self.update_manager = BackgroundUpdateManager(self)
@@ -1751,7 +2199,7 @@ class Application(TkinterDnD.Tk):
         self.protocol("WM_DELETE_WINDOW", self.on_closing)
 
         # 創建標籤拖放視窗
-        self.tag_drop_window = TagDropWindow(self, self.file_manager.get_all_used_tags(), self.handle_tag_drop)
+        self.tag_drop_window = TagDropWindow(self, self.handle_tag_drop)
         # 設置快捷鍵配置
         if hasattr(self, 'hotkey_modifier') and hasattr(self, 'hotkey_key'):
             self.tag_drop_window.update_hotkey(self.hotkey_modifier, self.hotkey_key)
@@ -1984,6 +2432,7 @@ class Application(TkinterDnD.Tk):
         # 更新標籤文字
         self.tag_frame.config(text=self.get_text("tags"))
         self.file_frame.config(text=self.get_text("file_list"))
+        self.update_file_count(self.file_count)
         self.filter_tags_label.config(text=self.get_text("filter_tags"))
         self.filter_files_label.config(text=self.get_text("filter_files"))
         self.file_type_label.config(text=self.get_text("file_type"))
@@ -2017,14 +2466,7 @@ class Application(TkinterDnD.Tk):
             self.file_type_combo.current(current_index)
         else:
             self.file_type_combo.current(0)  # 預設選擇"全部類型"
-        
-        # 更新檔案限制提示訊息
-        if hasattr(self, 'limit_message_label'):
-            total_count = len(self.all_files) if hasattr(self, 'all_files') else 0
-            if total_count > 1000:
-                self.limit_message_label.config(
-                    text=f"{self.get_text('file_limit_message')} ({total_count} {self.get_text('total_files')})"
-                )
+
 
     def center_window(self, window, width, height, parent=None):
         """
@@ -2094,6 +2536,9 @@ class Application(TkinterDnD.Tk):
             height=10
         )
         self.tag_list.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        # 以標籤名稱對應列表項目，更新時只套用差異
+        self.tag_list_sync = TreeReconciler(self.tag_list)
+        self.highlighted_tag = None  # 拖曳時高亮的標籤
         
         # 設置拖放目標
         self.tag_list.drop_target_register(DND_FILES)
@@ -2165,9 +2610,8 @@ class Application(TkinterDnD.Tk):
         )
         self.file_tree.grid(row=1, column=0, sticky="nsew", padx=0, pady=0)
 
-        # 添加垂直滾動條
-        file_scrollbar_y = tb.Scrollbar(file_frame, orient=tk.VERTICAL, command=self.file_tree.yview, bootstyle="round")
-        self.file_tree.config(yscrollcommand=file_scrollbar_y.set)
+        # 添加垂直滾動條（由虛擬列表依結果位置控制）
+        file_scrollbar_y = tb.Scrollbar(file_frame, orient=tk.VERTICAL, bootstyle="round")
         file_scrollbar_y.grid(row=1, column=1, sticky='ns', pady=0)
 
         # 添加水平滾動條
@@ -2183,16 +2627,20 @@ class Application(TkinterDnD.Tk):
         self.file_tree.bind('<Button-3>', self.show_context_menu)
         self.file_tree.bind('<Motion>', self.show_tooltip)
         self.file_tree.bind('<Leave>', self.hide_tooltip)
-        self.file_tree.bind('<<TreeviewSelect>>', self.update_edit_buttons_state)
+        # 虛擬列表在選取的檔案改變時才產生此事件（捲動時重設可見列的選取不會觸發）
+        self.file_tree.bind(VirtualFileList.SELECT_EVENT, self.update_edit_buttons_state)
         
         # 設定欄位自動拉伸以填滿空間
         self.file_tree.column("#0", stretch=True, anchor='w')  # 確保欄位能夠伸並左對齊
         self.file_tree.heading("#0", text=self.get_text("file_name"), anchor='w')  # 修改
 
-        # 儲存所有文件以便分批載入
-        self.all_files = []
-        self.load_batch_size = 100  # 每次載入的文件數量
-        self.current_batch = 0
+        # 檔案數顯示
+        self.file_count_label = tb.Label(file_frame, text="", bootstyle="info")
+        self.file_count_label.grid(row=3, column=0, sticky="w", padx=5, pady=(0, 5))
+        self.file_count = 0
+
+        # 只顯示可見範圍的檔案，捲動時才向查詢結果取出
+        self.file_list = VirtualFileList(self.file_tree, file_scrollbar_y, count_callback=self.update_file_count)
 
         # 當前選中標籤顯示標籤
         self.label_current_tag = tb.Label(self.main_frame, text="", font=("Segoe UI", 14, "bold"))
@@ -2307,6 +2755,8 @@ class Application(TkinterDnD.Tk):
             relief="solid"
         )
         self.tooltip.place_forget()
+        self.tooltip_path = None  # 目前提示顯示的檔案
+        self.tooltip_size = (0, 0)  # 目前提示的寬高
 
         # 右鍵選單
         self.context_menu = tb.Menu(self, tearoff=0)
@@ -2340,69 +2790,51 @@ class Application(TkinterDnD.Tk):
 
     def filter_tag_list(self, *args):
         """根輸入框內篩選標籤列表"""
-        search_text = self.tag_search_var.get().strip().lower()
-        all_tags = self.file_manager.get_all_used_tags()
-        filtered_tags = [tag for tag in all_tags if search_text in tag.lower()]
+        self.sync_tag_list()
 
-        self.tag_list.delete(*self.tag_list.get_children())
-        for tag in filtered_tags:
-            self.tag_list.insert('', tk.END, text=tag)  # 使用 text 代替 values
+    def sync_tag_list(self):
+        """依過濾條件與標籤顏色更新標籤列表
 
-    def filter_file_list(self, *args):
-        """根據輸入框的內容篩選檔案列表，並根據選擇的檔案類型篩選"""
+        只插入、刪除或移動有變化的項目，保留下來的項目維持原本的選取狀態。
+        """
+        search_text = self.tag_search_var.get().strip().lower()
+        
+        # 依快取的顯示順序（有顏色的標籤在前）套用過濾條件
+        rows = []
+        for tag, color in self.file_manager.get_tag_view():
+            if search_text not in tag.lower():
+                continue
+            if color is None:
+                rows.append((tag, {'text': tag, 'tags': ()}))
+            else:
+                # 為每個標籤創建唯一的標籤樣式
+                tag_style = f'tag_{hash(tag)}'
+                self.tag_list_sync.configure_style(tag_style, foreground=color)
+                rows.append((tag, {'text': tag, 'tags': (tag_style,)}))
+        self.tag_list_sync.sync(rows)
+        # 高亮的標籤已被移除時，其標記隨項目一併刪除，之後回到同一列時需重新高亮
+        if self.highlighted_tag is not None and self.highlighted_tag not in self.tag_list_sync:
+            self.highlighted_tag = None
+
+    def filter_file_list(self, *args, keep_position=False):
+        """根據輸入框的內容篩選檔案列表，並根據選擇的檔案類型篩選
+
+        keep_position 為 True 時（例如檔案監控觸發的更新）維持目前的捲動位置。
+        """
         # 設置更新狀態為True，阻止自動更新
         self.update_manager.set_updating(True)
         
         try:
-            # 保存當前選中的檔案路徑
-            selected_items = self.file_tree.selection()
-            selected_paths = []
-            for item in selected_items:
-                try:
-                    file_path = self.file_tree.item(item, 'values')[0]
-                    selected_paths.append(file_path)
-                except:
-                    continue
-            
-            # 取消當前的載入過程
-            self.cancel_current_loading()
-            
-            search_text = self.search_var.get().strip().lower()
-            selected_file_type = self.file_type_var.get()
-            # 使用索引判斷是否選擇了"全部類型"
-            is_all_types = self.file_type_combo.current() == 0
-
-            # 使用生成器獲取基礎檔案列表
-            def get_base_files():
-                if hasattr(self, 'showing_untagged') and self.showing_untagged:
-                    yield from self.file_manager.list_untagged_files()
-                elif hasattr(self, 'current_tag_selection') and self.current_tag_selection:
-                    yield from self.file_manager.search_by_tags(self.current_tag_selection)
-                else:
-                    yield from self.file_manager.search_by_tags("")
-
-            # 使用生成器進行篩選
-            def filter_files():
-                for file in get_base_files():
-                    if not is_all_types and not file.lower().endswith(selected_file_type):
-                        continue
-                    if search_text and search_text not in os.path.basename(file).lower():
-                        continue
-                    yield file
-
-            # 使用 itertools.islice 限制數量並轉換為列表
-            filtered_files = list(itertools.islice(filter_files(), 1000))
-            
-            # 顯示提示訊息
-            total_count = sum(1 for _ in get_base_files())  # 使用生成器計算總數
-            self.show_file_limit_message(total_count)
+            # 獲取基礎檔案列表（檔案類型由副檔名索引篩選），並應用搜尋文字過濾
+            if hasattr(self, 'showing_untagged') and self.showing_untagged:
+                result = self.get_file_result(untagged=True)
+            elif hasattr(self, 'current_tag_selection') and self.current_tag_selection:
+                result = self.get_file_result(self.current_tag_selection)
+            else:
+                result = self.get_file_result()
 
-            # 保存選中的檔案路徑到實例變量
-            self.selected_paths = selected_paths
-            
-            # 更新 all_files 並開始新的載入
-            self.all_files = filtered_files
-            self.start_new_loading()
+            # 顯示查詢結果，只取出可見範圍的檔案（選取的檔案會保留）
+            self.file_list.set_source(result, keep_position)
 
             # 更新檔案類型選項
             self.update_file_type_options()
@@ -2414,24 +2846,17 @@ class Application(TkinterDnD.Tk):
             # 設置更新狀態為False，允許自動更新
             self.update_manager.set_updating(False)
 
-    def show_file_limit_message(self, total_count):
-        """顯示檔案數量超過限制的提示訊息"""
-        if not hasattr(self, 'limit_message_label'):
-            self.limit_message_label = tb.Label(
-                self.file_frame,
-                text="",
-                bootstyle="warning",
-                font=("Segoe UI", 14)
-            )
-            self.limit_message_label.grid(row=3, column=0, sticky="ew", padx=5, pady=(0, 5))
-        
-        if total_count > 1000:
-            self.limit_message_label.config(
-                text=f"{self.get_text('file_limit_message')} ({total_count} {self.get_text('total_files')})"
-            )
-            self.limit_message_label.grid()
-        else:
-            self.limit_message_label.grid_remove()
+    def get_selected_file_type(self):
+        """返回目前選擇的副檔名，選擇"全部類型"時返回 None"""
+        # 使用索引判斷是否選擇了"全部類型"
+        if self.file_type_combo.current() == 0:
+            return None
+        return self.file_type_var.get().lower()
+
+    def get_file_result(self, tags="", untagged=False):
+        """返回符合標籤（或未標籤）、目前檔案類型與搜尋框內容的檔案（QueryResult）"""
+        return self.file_manager.find_files(tags, self.get_selected_file_type(),
+                                            self.search_var.get(), untagged)
 
     def list_untagged_files(self, event=None):
         """列出未標籤檔案，並應用篩選條件"""
@@ -2439,9 +2864,6 @@ class Application(TkinterDnD.Tk):
             # 設置更新狀態為True，阻止自動更新
             self.update_manager.set_updating(True)
             
-            # 取消當前的載入過程
-            self.cancel_current_loading()
-            
             # 清除當標籤選擇，設置未標籤標記
             self.current_tag_selection = None
             self.showing_untagged = True
@@ -2450,33 +2872,11 @@ class Application(TkinterDnD.Tk):
             # 清除標籤顯示
             self.label_current_tag.pack_forget()
             
-            # 獲取未標籤檔案列表
-            untagged_files = self.file_manager.list_untagged_files()
-
-            # 應用當前的檔案類型過濾
-            # 使用索引判斷是否選擇了"全部類型"
-            is_all_types = self.file_type_combo.current() == 0
-            selected_file_type = self.file_type_var.get()
-            if not is_all_types:
-                untagged_files = [file for file in untagged_files if file.lower().endswith(selected_file_type)]
-
-            # 應用搜尋文字過濾
-            search_text = self.search_var.get().strip().lower()
-            if search_text:
-                untagged_files = [file for file in untagged_files if search_text in os.path.basename(file).lower()]
-
-            # 顯示提示訊息（不論是否超過限制）
-            self.show_file_limit_message(len(untagged_files))
-
-            # 限制顯示數量
-            if len(untagged_files) > 1000:
-                untagged_files = untagged_files[:1000]
+            # 獲取未標籤檔案列表，並應用當前的檔案類型與搜尋文字過濾
+            result = self.get_file_result(untagged=True)
 
             # 更新文件列表
-            self.all_files = untagged_files.copy()
-            
-            # 開始新的載入過程
-            self.start_new_loading()
+            self.file_list.set_source(result)
 
             # 更新文件類型選項（保持基於所有文件）
             self.update_file_type_options()
@@ -2614,9 +3014,6 @@ class Application(TkinterDnD.Tk):
         try:
             selection = self.tag_list.selection()
             if selection:
-                # 取消當前的載入過程
-                self.cancel_current_loading()
-                
                 # 清除未標籤標記
                 self.showing_untagged = False
                 
@@ -2624,31 +3021,11 @@ class Application(TkinterDnD.Tk):
                 selected_tags = [self.tag_list.item(item, 'text') for item in selection]
                 self.current_tag_selection = ','.join(selected_tags)
                 
-                # 獲取同時擁有所有選定標籤的檔案
-                full_paths = self.file_manager.search_by_tags(self.current_tag_selection)
-                
-                # 應用當前的檔案類型過濾
-                # 使用索引判斷是否選擇了"全部類型"
-                is_all_types = self.file_type_combo.current() == 0
-                selected_file_type = self.file_type_var.get()
-                if not is_all_types:
-                    full_paths = [file for file in full_paths if file.lower().endswith(selected_file_type)]
-                
-                # 應用搜尋文字過濾
-                search_text = self.search_var.get().strip().lower()
-                if search_text:
-                    full_paths = [file for file in full_paths if search_text in os.path.basename(file).lower()]
-                
-                # 顯示提示訊息（不論是否超過限制）
-                self.show_file_limit_message(len(full_paths))
-                
-                # 限制顯示數量
-                if len(full_paths) > 1000:
-                    full_paths = full_paths[:1000]
+                # 獲取同時擁有所有選定標籤的檔案，並應用當前的檔案類型與搜尋文字過濾
+                result = self.get_file_result(self.current_tag_selection)
                 
-                # 清空並重新填充文件列表
-                self.all_files = full_paths
-                self.start_new_loading()
+                # 重新顯示文件列表
+                self.file_list.set_source(result)
 
                 # 更新標籤顯示
                 if len(selected_tags) == 1:
@@ -2679,30 +3056,10 @@ class Application(TkinterDnD.Tk):
                     self.rename_tag_btn.config(state=tk.DISABLED)
                     self.change_color_btn.config(state=tk.DISABLED)
                     
-                    # 當沒有選擇標籤時，顯示所有檔案並應用過濾條件
-                    full_paths = self.file_manager.search_by_tags("")
+                    # 當沒有選擇標籤時，顯示所有檔案並應用過濾條件（含檔案類型）
+                    result = self.get_file_result()
                     
-                    # 應用當前的檔案類型過濾
-                    # 使用索引判斷是否選擇了"全部類型"
-                    is_all_types = self.file_type_combo.current() == 0
-                    selected_file_type = self.file_type_var.get()
-                    if not is_all_types:
-                        full_paths = [file for file in full_paths if file.lower().endswith(selected_file_type)]
-                    
-                    # 應用搜尋文字過濾
-                    search_text = self.search_var.get().strip().lower()
-                    if search_text:
-                        full_paths = [file for file in full_paths if search_text in os.path.basename(file).lower()]
-                    
-                    # 顯示提示訊息
-                    self.show_file_limit_message(len(full_paths))
-                    
-                    # 限制顯示數量
-                    if len(full_paths) > 1000:
-                        full_paths = full_paths[:1000]
-                    
-                    self.all_files = full_paths
-                    self.start_new_loading()
+                    self.file_list.set_source(result)
                     
                     # 保存當前選擇的標籤到配置（清除選擇）
                     self.save_config()
@@ -2710,28 +3067,10 @@ class Application(TkinterDnD.Tk):
             # 設置更新狀態為False，允許自動更新
             self.update_manager.set_updating(False)
 
-    def cancel_current_loading(self):
-        """取消當前的檔案載入過程"""
-        self.is_loading_cancelled = True
-        self.current_batch = 0
-
-    def start_new_loading(self):
-        """開始新的檔案載入過程"""
-        self.is_loading_cancelled = False
-        self.current_batch_id += 1
-        self.current_batch = 0
-        self.file_tree.delete(*self.file_tree.get_children())
-        self.load_files_in_batches()
-
     def select_intended_file(self):
         """選中預期選擇的檔案"""
-        children = self.file_tree.get_children()
-        for child in children:
-            if self.file_tree.item(child, 'values')[0] == self.intended_selection:
-                self.file_tree.selection_set(child)
-                self.file_tree.focus(child)
-                self.file_tree.see(child)
-                break
+        if self.intended_selection:
+            self.file_list.select_paths([self.intended_selection])
         self.intended_selection = None  # 清除記錄
 
     def show_help(self):
@@ -2789,49 +3128,8 @@ class Application(TkinterDnD.Tk):
 
     def refresh_tag_list(self):
         """更新標籤列表，並套用過濾條件"""
-        # 保存當前選中的標籤
-        selected_tags = [self.tag_list.item(item, 'text') for item in self.tag_list.selection()]
-        
-        # 獲取當前的過濾文字
-        search_text = self.tag_search_var.get().strip().lower()
-        
-        # 清空並重新填充標籤列表
-        self.tag_list.delete(*self.tag_list.get_children())
-        all_tags = self.file_manager.get_all_used_tags()
-        
-        # 套用過濾條件
-        filtered_tags = [tag for tag in all_tags if search_text in tag.lower()]
-        
-        # 將標籤分為兩組：有顏色的和沒有顏色的
-        colored_tags = []
-        normal_tags = []
-        for tag in filtered_tags:
-            if self.file_manager.get_tag_color(tag) != self.file_manager.default_color:
-                colored_tags.append(tag)
-            else:
-                normal_tags.append(tag)
-        
-        # 對有顏色的標籤按修改時間排序（最新的在前）
-        colored_tags.sort(key=lambda tag: self.file_manager.get_tag_color_timestamp(tag), reverse=True)
-        
-        # 先插入有顏色的標籤，再插入普通標籤
-        for tag in colored_tags + normal_tags:
-            color = self.file_manager.get_tag_color(tag)
-            item = self.tag_list.insert('', tk.END, text=tag)
-            # 為每個標籤創建唯一的標籤樣式
-            tag_style = f'tag_{hash(tag)}'
-            # 只有當顏色不是預設顏色時才設置標籤樣式
-            if color != self.file_manager.default_color:
-                self.tag_list.tag_configure(tag_style, foreground=color)
-                self.tag_list.item(item, tags=(tag_style,))
-        
-        # 恢復之前選中的標籤（如果它們仍然存在於過濾後的列表中）
-        for tag in selected_tags:
-            if tag in filtered_tags:
-                for item in self.tag_list.get_children():
-                    if self.tag_list.item(item, 'text') == tag:
-                        self.tag_list.selection_add(item)
-                        self.tag_list.see(item)
+        # 只套用差異，仍存在的標籤保持選取
+        self.sync_tag_list()
         
         # 如果有選中的標籤，更新檔案列表
         if self.tag_list.selection():
@@ -2842,7 +3140,7 @@ class Application(TkinterDnD.Tk):
 
         # 更新拖放視窗的標籤列表
         if hasattr(self, 'tag_drop_window'):
-            self.tag_drop_window.update_tags(self.file_manager.get_all_used_tags())
+            self.tag_drop_window.update_tags()
 
     def is_dark_color(self, color):
         """判斷顏色是否為深色"""
@@ -2874,8 +3172,13 @@ class Application(TkinterDnD.Tk):
         except Exception:
             return True  # 發生任何錯誤時，預設返回 True
 
+    def update_file_count(self, count):
+        """更新檔案列表下方的檔案數"""
+        self.file_count = count
+        self.file_count_label.config(text=f"{count} {self.get_text('total_files')}")
+
     def update_edit_buttons_state(self, event=None):
-        selected = self.file_tree.selection()
+        selected = self.file_list.selected
         if selected:
             self.add_tag_btn.config(state=tk.NORMAL)
             self.edit_note_btn.config(state=tk.NORMAL)
@@ -2883,8 +3186,7 @@ class Application(TkinterDnD.Tk):
             
             # 檢查選取的檔案中是否有至少一個有標籤
             remove_enabled = False
-            for i in selected:
-                full_path = self.file_tree.item(i, 'values')[0]
+            for full_path in selected:
                 if self.file_manager.files_tags.get(full_path, {}).get("tags"):
                     remove_enabled = True
                     break
@@ -2897,8 +3199,7 @@ class Application(TkinterDnD.Tk):
             self.export_files_btn.config(state=tk.DISABLED)  # 确保在没有选择文件时禁用导出按钮
 
     def add_tags(self, event=None):
-        selected_items = self.file_tree.selection()
-        selected_files = [self.file_tree.item(i, 'values')[0] for i in selected_items]
+        selected_files = self.file_list.selected_paths()
         if not selected_files:
             CustomMessageBox.show_info(self, self.get_text("info"), self.get_text("select_files_to_tag"))  # 修改
             return
@@ -3005,8 +3306,7 @@ class Application(TkinterDnD.Tk):
         btn_save.pack(pady=20)
 
     def remove_tags(self, event=None):
-        selected_items = self.file_tree.selection()
-        selected_files = [self.file_tree.item(i, 'values')[0] for i in selected_items]
+        selected_files = self.file_list.selected_paths()
         if not selected_files:
             # 修改：使用翻譯文字
             CustomMessageBox.show_info(self, self.get_text("info"), self.get_text("select_files"))
@@ -3088,8 +3388,7 @@ class Application(TkinterDnD.Tk):
         btn_save.pack(pady=20)
 
     def edit_notes(self, event=None):
-        selected_items = self.file_tree.selection()
-        selected_files = [self.file_tree.item(i, 'values')[0] for i in selected_items]
+        selected_files = self.file_list.selected_paths()
         if not selected_files:
             CustomMessageBox.show_info(self, self.get_text("info"), self.get_text("select_files"))
             return
@@ -3299,29 +3598,37 @@ class Application(TkinterDnD.Tk):
         item_id = widget.identify_row(event.y)
         if item_id:
             full_path = widget.item(item_id, 'values')[0]
-            note = self.file_manager.get_note(full_path)
-
-            if note:
-                tooltip_text = f"{self.get_text('note_prefix')}\n{note}"  # 添加換行符
-                # 設置有備註的 Tooltip 樣式
-                self.tooltip.config(
-                    text=tooltip_text,
-                    foreground="white",
-                    background="#007ACC",  # 藍色背景
-                    font=("Segoe UI", 14, "bold"),
-                    wraplength=400  # 添加自動換行
-                )
-            else:
-                # 顯示完整路徑
-                tooltip_text = full_path
-                # 設置無備註的 Tooltip 樣式
-                self.tooltip.config(
-                    text=tooltip_text,
-                    foreground="white",
-                    background="#333333",  # 深灰色背景
-                    font=("Segoe UI", 14, "normal"),
-                    wraplength=400  # 添加自動換行
-                )
+
+            # 只在滑鼠移到另一列時才讀取備註並重新設定內容，同一列內只移動位置
+            if full_path != self.tooltip_path:
+                note = self.file_manager.get_note(full_path)
+
+                if note:
+                    tooltip_text = f"{self.get_text('note_prefix')}\n{note}"  # 添加換行符
+                    # 設置有備註的 Tooltip 樣式
+                    self.tooltip.config(
+                        text=tooltip_text,
+                        foreground="white",
+                        background="#007ACC",  # 藍色背景
+                        font=("Segoe UI", 14, "bold"),
+                        wraplength=400  # 添加自動換行
+                    )
+                else:
+                    # 顯示完整路徑
+                    tooltip_text = full_path
+                    # 設置無備註的 Tooltip 樣式
+                    self.tooltip.config(
+                        text=tooltip_text,
+                        foreground="white",
+                        background="#333333",  # 深灰色背景
+                        font=("Segoe UI", 14, "normal"),
+                        wraplength=400  # 添加自動換行
+                    )
+
+                self.tooltip.update_idletasks()
+                self.tooltip_size = (self.tooltip.winfo_reqwidth(), self.tooltip.winfo_reqheight())
+                self.tooltip_path = full_path
+                self.tooltip.lift()
             
             # 計算 Tooltip 位置
             window_x = self.winfo_rootx()
@@ -3333,9 +3640,7 @@ class Application(TkinterDnD.Tk):
             window_width = self.winfo_width()
             window_height = self.winfo_height()
 
-            self.tooltip.update_idletasks()
-            tooltip_width = self.tooltip.winfo_reqwidth()
-            tooltip_height = self.tooltip.winfo_reqheight()
+            tooltip_width, tooltip_height = self.tooltip_size
 
             if x + tooltip_width > window_width:
                 x = window_width - tooltip_width - 10
@@ -3343,11 +3648,11 @@ class Application(TkinterDnD.Tk):
                 y = window_height - tooltip_height - 10
 
             self.tooltip.place(x=x, y=y)
-            self.tooltip.lift()
-        else:
+        elif self.tooltip_path is not None:
             self.hide_tooltip()
 
     def hide_tooltip(self, event=None):
+        self.tooltip_path = None
         self.tooltip.place_forget()
 
     def show_context_menu(self, event):
@@ -3356,11 +3661,12 @@ class Application(TkinterDnD.Tk):
         item = self.file_tree.identify_row(event.y)
         if item:
             # 如果點擊項目不在當前選中項目中，則清除選擇並選中該項目
-            if item not in self.file_tree.selection():
-                self.file_tree.selection_set(item)
+            file_path = self.file_tree.item(item, 'values')[0]
+            if not self.file_list.is_selected(file_path):
+                self.file_list.select_paths([file_path])
             
             # 更新選中的檔案列表
-            self.selected_files = [self.file_tree.item(i, 'values')[0] for i in self.file_tree.selection()]
+            self.selected_files = self.file_list.selected_paths()
             # 顯示單
             self.context_menu.post(event.x_root, event.y_root)
 
@@ -3426,8 +3732,8 @@ class Application(TkinterDnD.Tk):
                             return
                         
                         # 清空檔案列表和標籤列表
-                        self.file_tree.delete(*self.file_tree.get_children())
-                        self.tag_list.delete(*self.tag_list.get_children())
+                        self.file_list.clear()
+                        self.tag_list_sync.clear()
                         
                         # 清空搜尋框
                         self.search_var.set("")
@@ -3436,11 +3742,6 @@ class Application(TkinterDnD.Tk):
                         # 重置檔案類型選擇
                         self.file_type_var.set("ALL")
                         
-                        # 清空其他相關變量
-                        self.all_files = []
-                        self.current_batch = 0
-                        self.is_loading_cancelled = True
-                        
                         logger.info("UI 已清空")
                     
                     # 在主線程中執行 UI 清理
@@ -3650,8 +3951,8 @@ class Application(TkinterDnD.Tk):
                         return
                     
                     # 清空檔案列表和標籤列表
-                    self.file_tree.delete(*self.file_tree.get_children())
-                    self.tag_list.delete(*self.tag_list.get_children())
+                    self.file_list.clear()
+                    self.tag_list_sync.clear()
                     
                     # 清空搜尋框
                     self.search_var.set("")
@@ -3660,11 +3961,6 @@ class Application(TkinterDnD.Tk):
                     # 重置檔案類型選擇
                     self.file_type_var.set("ALL")
                     
-                    # 清空其他相關變量
-                    self.all_files = []
-                    self.current_batch = 0
-                    self.is_loading_cancelled = True
-                    
                     logger.info("UI 已清空")
                 
                 # 在主線程中執行 UI 清理
@@ -3755,15 +4051,11 @@ class Application(TkinterDnD.Tk):
         search_text = self.search_var.get().strip().lower()
         filtered_files = [file for file in files if search_text in file.lower()]
 
-        self.file_tree.delete(*self.file_tree.get_children())
-        self.all_files = filtered_files
-        self.current_batch = 0
-        self.load_files_in_batches()
+        self.file_list.set_files(filtered_files)
 
         # 如果有預期選擇的檔案，嘗試選中它
         if self.intended_selection and self.intended_selection in filtered_files:
-            # 延遲選操作，等文件載入完成後再選中
-            self.after(100, self.select_intended_file)
+            self.select_intended_file()
 
         # 更新按鈕狀態
         self.update_edit_buttons_state()
@@ -3784,10 +4076,10 @@ class Application(TkinterDnD.Tk):
 
     def on_file_double_click(self, event):
         """處理檔案列表的雙擊事件"""
-        selected_items = self.file_tree.selection()
-        if selected_items:
-            # 获取选中文件的路径
-            selected_file = self.file_tree.item(selected_items[0], 'values')[0]
+        item = self.file_tree.identify_row(event.y)
+        if item:
+            # 获取双击文件的路径
+            selected_file = self.file_tree.item(item, 'values')[0]
             try:
                 # 使用系统默认程序打开文件
                 os.startfile(selected_file)
@@ -3798,15 +4090,16 @@ class Application(TkinterDnD.Tk):
         """啟動檔案監控"""
         self.file_manager.start_monitoring(self.handle_file_changes)
 
-    def handle_file_changes(self):
+    def handle_file_changes(self, events):
         """處理檔案變更"""
-        # 在後台處理文件更
-        self.update_manager.queue_update("scan_files", self.file_manager.folder_paths)
+        # 直接套用變更的檔案，不重新掃描整個資料夾
+        self.update_manager.apply_file_events(events)
 
     def destroy(self):
         """關閉應用程式時停止監控後台更新"""
         self.update_manager.stop()
         self.file_manager.stop_monitoring()
+        self.file_manager.close()  # 立即寫入尚未儲存的資料
         super().destroy()
 
     def update_file_type_options(self):
@@ -3867,32 +4160,26 @@ class Application(TkinterDnD.Tk):
 
     def on_drop_leave(self, event):
         """當拖曳離開項目時的處理"""
-        # 清除所有項目的高亮效果
-        for item in self.tag_list.get_children():
-            current_tags = list(self.tag_list.item(item)['tags'] or ())
-            if 'highlight' in current_tags:
-                current_tags.remove('highlight')
-            self.tag_list.item(item, tags=current_tags)
+        # 只清除目前高亮項目的效果，保留顏色樣式
+        self.set_highlighted_tag(None)
 
     def on_drop_motion(self, event):
         """當拖曳移動時的處理"""
-        # 清除所有項目的高亮效果
-        for item in self.tag_list.get_children():
-            self.tag_list.item(item, tags=())
-            
         # 獲取當前滑鼠位置下的項目
         y = event.widget.winfo_pointery() - event.widget.winfo_rooty()
         target_item = self.tag_list.identify_row(y)
-        
-        if target_item:
-            # 獲取該項目原有的標籤樣式（如果有的話）
-            current_tags = list(self.tag_list.item(target_item)['tags'] or ())
-            if 'highlight' not in current_tags:
-                current_tags.append('highlight')
-            
-            # 設置高亮效果
-            self.tag_list.tag_configure('highlight', background='#E1F5FE')
-            self.tag_list.item(target_item, tags=current_tags)
+        self.set_highlighted_tag(self.tag_list_sync.key_of(target_item) if target_item else None)
+
+    def set_highlighted_tag(self, tag):
+        """移動拖曳的高亮效果，只更新前後兩個項目"""
+        if tag == self.highlighted_tag:
+            return
+        if self.highlighted_tag is not None:
+            self.tag_list_sync.mark(self.highlighted_tag)
+        if tag is not None:
+            self.tag_list_sync.configure_style('highlight', background='#E1F5FE')
+            self.tag_list_sync.mark(tag, ('highlight',))
+        self.highlighted_tag = tag
 
     def on_drop(self, event):
         """處理檔案拖放事件"""
@@ -3967,100 +4254,46 @@ class Application(TkinterDnD.Tk):
         )
         
         if confirm:
-            added_count = 0
-            # 為每個檔案添加標籤
-            for file_path in files:
-                # 檢查檔案是否存在
-                if os.path.exists(file_path):
-                    # 檢查檔案是否在管理的資料夾中
-                    is_in_managed_folder = False
-                    for folder_path in self.file_manager.folder_paths:
-                        if file_path.lower().startswith(folder_path.lower()):
-                            is_in_managed_folder = True
-                            break
-                    
-                    if not is_in_managed_folder:
-                        # 如果檔案不在管理的資料夾中，將其所在資料夾添加到管理資料夾
-                        folder_path = os.path.dirname(file_path)
-                        if folder_path not in self.file_manager.folder_paths:
-                            self.file_manager.folder_paths.append(folder_path)
-                            self.file_manager.set_folder_paths(self.file_manager.folder_paths)
-                    
-                    # 添加標籤
-                    self.file_manager.add_tag(file_path, target_tag)
-                    added_count += 1
+            def show_result(tagged):
+                if tagged:
+                    # 顯示成功訊息
+                    CustomMessageBox.show_info(
+                        self,
+                        self.get_text("success"),
+                        self.get_text("files_tagged_success").format(count=len(tagged), tag=target_tag)
+                    )
+                else:
+                    CustomMessageBox.show_warning(
+                        self,
+                        self.get_text("warning"),
+                        self.get_text("no_files_tagged")
+                    )
             
-            if added_count > 0:
+            self.tag_dropped_files(files, target_tag, show_result)
+
+    def tag_dropped_files(self, files, tag, on_done):
+        """在背景線程為拖放的檔案加上標籤，完成後在主線程更新列表，並以新加上標籤的檔案呼叫 on_done
+        
+        計算大量檔案的檔案標識（以及加入新的資料夾時的掃描）不阻塞界面。
+        """
+        def process_files():
+            try:
+                # 一次為所有檔案添加標籤（不在管理資料夾中的檔案，其所在資料夾會加入管理資料夾）
+                tagged = self.file_manager.tag_paths(files, tag)
+            except Exception as e:
+                logger.error(f"為拖放的檔案添加標籤時出錯: {str(e)}")
+                tagged = []
+            self.after(0, lambda: update_ui(tagged))
+        
+        def update_ui(tagged):
+            if tagged:
                 # 更新界面
                 self.refresh_tag_list()
                 self.update_file_list_by_tag_selection()
                 self.update_edit_buttons_state()
-                
-                # 顯示成功訊息
-                CustomMessageBox.show_info(
-                    self,
-                    self.get_text("success"),
-                    self.get_text("files_tagged_success").format(count=added_count, tag=target_tag)
-                )
-            else:
-                CustomMessageBox.show_warning(
-                    self,
-                    self.get_text("warning"),
-                    self.get_text("no_files_tagged")
-                )
-
-    def load_files_in_batches(self):
-        """分批載入檔案到Treeview中以保持UI流暢"""
-        if self.is_loading_cancelled:
-            return
-
-        if not hasattr(self, 'all_files') or self.all_files is None:
-            self.all_files = []
-            return
-
-        start = self.current_batch * self.load_batch_size
-        end = min(start + self.load_batch_size, len(self.all_files))
-        batch = self.all_files[start:end]
-
-        # 如果是第一批，清空現有項目
-        if self.current_batch == 0:
-            self.file_tree.delete(*self.file_tree.get_children())
-            
-        # 禁用重繪以提高性能
-        self.file_tree.configure(height=1)  # 臨時減少高度以加快插入
-
-        # 批量插入檔案
-        items_to_insert = []
-        for full_path in batch:
-            file_name = os.path.basename(full_path)
-            items_to_insert.append(('', 'end', file_name, (full_path,)))
-
-        # 使用批量插入
-        for item in items_to_insert:
-            item_id = self.file_tree.insert(item[0], item[1], text=item[2], values=item[3])
-            if hasattr(self, 'selected_paths') and item[3][0] in self.selected_paths:
-                self.file_tree.selection_add(item_id)
-
-        # 恢復正常高度
-        self.file_tree.configure(height=20)  # 或其他適當的高度
-
-        self.current_batch += 1
+            on_done(tagged)
         
-        # 如果還有更多檔案要載入，安排下一批
-        if end < len(self.all_files) and not self.is_loading_cancelled:
-            self.after(100, self.load_files_in_batches)  # 增加延遲時間到100ms以減少UI凍結
-
-    def cancel_current_loading(self):
-        """取消当前的文件加载过程"""
-        self.is_loading_cancelled = True
-        self.current_batch = 0
-
-    def start_new_loading(self):
-        """开始新的文件加载过程"""
-        self.is_loading_cancelled = False
-        self.current_batch = 0
-        self.file_tree.delete(*self.file_tree.get_children())
-        self.load_files_in_batches()
+        threading.Thread(target=process_files, name='tag-drop', daemon=True).start()
 
     def show_theme_dialog(self):
         """顯示主題選擇對話框"""
@@ -4138,27 +4371,8 @@ class Application(TkinterDnD.Tk):
             # 然後切換主題
             self.style.theme_use(theme_name)
             
-            # 保存當前選中的標籤
-            selected_tags = [self.tag_list.item(item, 'text') for item in self.tag_list.selection()]
-            
-            # 更新標籤的顏色
-            for item in self.tag_list.get_children():
-                tag_text = self.tag_list.item(item, 'text')
-                color = self.file_manager.get_tag_color(tag_text)
-                tag_style = f'tag_{hash(tag_text)}'
-                
-                # 只有當顏色不是預設顏色時才設置標籤樣式
-                if color != self.file_manager.default_color:
-                    self.tag_list.tag_configure(tag_style, foreground=color)
-                    self.tag_list.item(item, tags=(tag_style,))
-                else:
-                    # 如果是預設顏色，移除標籤樣式
-                    self.tag_list.item(item, tags=())
-            
-            # 恢復選中的標籤
-            for item in self.tag_list.get_children():
-                if self.tag_list.item(item, 'text') in selected_tags:
-                    self.tag_list.selection_add(item)
+            # 更新標籤的顏色，選取狀態不受影響
+            self.sync_tag_list()
             
             # 最後保存配置
             self.save_config()
@@ -4328,42 +4542,16 @@ class Application(TkinterDnD.Tk):
 
     def clear_file_list(self):
         """清空檔案列表"""
-        self.file_tree.delete(*self.file_tree.get_children())
+        self.file_list.clear()
         self.file_type_var.set(self.get_text("all_types"))
-        self.all_files = []
 
     def handle_tag_drop(self, files, tag):
-        """處理標籤拖放視窗的回調"""
-        # 檢查檔案是否存在
-        valid_files = []
-        for file_path in files:
-            if os.path.exists(file_path):
-                # 檢查檔案是否在管理的資料夾中
-                is_in_managed_folder = False
-                for folder_path in self.file_manager.folder_paths:
-                    if file_path.lower().startswith(folder_path.lower()):
-                        is_in_managed_folder = True
-                        break
-                
-                if not is_in_managed_folder:
-                    # 如果檔案不在管理的資料夾中，將其所在資料夾添加到管理資料夾
-                    folder_path = os.path.dirname(file_path)
-                    if folder_path not in self.file_manager.folder_paths:
-                        self.file_manager.folder_paths.append(folder_path)
-                        self.file_manager.set_folder_paths(self.file_manager.folder_paths)
-                
-                valid_files.append(file_path)
-        
-        # 為每個有效檔案添加標籤
-        for file_path in valid_files:
-            self.file_manager.add_tag(file_path, tag)
-        
+        """處理標籤拖放視窗的回調（標籤在背景線程加上，完成後才顯示訊息）"""
+        self.tag_dropped_files(files, tag, lambda tagged: self.show_drop_success(tagged, tag))
+
+    def show_drop_success(self, valid_files, tag):
+        """以非模態對話框顯示拖放到標籤拖放視窗的結果"""
         if valid_files:
-            # 更新界面
-            self.refresh_tag_list()
-            self.update_file_list_by_tag_selection()
-            self.update_edit_buttons_state()
-            
             # 使用非模態對話框顯示成功訊息
             success_window = tk.Toplevel()
             success_window.title(self.get_text("success"))
@@ -4580,8 +4768,8 @@ class Application(TkinterDnD.Tk):
                 )
                 
                 if file_path:
-                    # 直接複製 file_tags.json 的內容
-                    shutil.copy2(self.file_manager.db_file, file_path)
+                    # 以 file_tags.json 的格式匯出
+                    self.file_manager.export_json(file_path)
                     CustomMessageBox.show_info(
                         self,
                         self.get_text('export_successful'),
@@ -4779,6 +4967,9 @@ class Application(TkinterDnD.Tk):
                         'name': current_file['name']
                     }
             
+            # 匯入的紀錄直接寫入 db_data，需重建索引
+            self.file_manager.rebuild_index()
+            
             logger.info(f"資料合併完成 - 合併: {merged_count} 筆, 新增: {added_count} 筆")
             
         except Exception as e:
@@ -4787,8 +4978,8 @@ class Application(TkinterDnD.Tk):
 
     def export_selected_files(self):
         """导出选中的文件"""
-        selected_items = self.file_tree.selection()
-        if not selected_items:
+        selected_files = self.file_list.selected_paths()
+        if not selected_files:
             CustomMessageBox.show_warning(self, self.get_text("warning"), self.get_text("no_files_selected"))
             return
 
@@ -4800,8 +4991,7 @@ class Application(TkinterDnD.Tk):
         try:
             # 获取选中的文件路径
             files_to_export = []
-            for item in selected_items:
-                file_path = self.file_tree.item(item, 'values')[0]
+            for file_path in selected_files:
                 if os.path.exists(file_path):
                     files_to_export.append(file_path)
 
@@ -4,7 +4,10 @@ import ttkbootstrap as tb
 from tkinterdnd2 import DND_FILES
 import os
 import ctypes
+import queue
 from languages import LANGUAGES
+from HotkeyListener import HotkeyListener
+from TreeSync import TreeReconciler
 
 # 定義 Windows API 結構
 class RECT(ctypes.Structure):
@@ -107,7 +110,7 @@ class CustomMessageBox(tk.Toplevel):
         return dialog.result
 
 class TagDropWindow(tk.Toplevel):
-    def __init__(self, parent, tag_list, on_drop_callback):
+    def __init__(self, parent, on_drop_callback, hotkey_backend=None):
         super().__init__(parent)
         
         # 保存回調函數和父視窗
@@ -119,7 +122,13 @@ class TagDropWindow(tk.Toplevel):
         # 初始化快捷鍵設置
         self.hotkey_modifier = "Ctrl"  # 預設修飾鍵
         self.hotkey_key = "1"  # 預設按鍵
-        self.hotkey_id = 1  # 快捷鍵ID
+        self.hotkey_held = False  # 快捷鍵是否按住中
+        self.hide_pending = False  # 等待訊息框關閉後隱藏
+        
+        # 快捷鍵由背景執行緒監聽，事件經佇列交給主線程處理
+        self.hotkey_events = queue.Queue()
+        self.hotkey_listener = HotkeyListener(self.hotkey_events, self.notify_hotkey_event, hotkey_backend)
+        self.bind('<<HotkeyEvent>>', self.process_hotkey_events)
         
         # 設置視窗屬性
         self.overrideredirect(True)  # 移除標題欄
@@ -140,7 +149,7 @@ class TagDropWindow(tk.Toplevel):
         self.main_frame.pack(fill=tk.BOTH, expand=True)
         
         # 創建標籤列表
-        self.create_tag_list(tag_list)
+        self.create_tag_list()
         
         # 初始隱藏視窗
         self.withdraw()
@@ -153,42 +162,14 @@ class TagDropWindow(tk.Toplevel):
         
         # 註冊全域快捷鍵
         self.register_hotkey()
-        
-        # 設置定時器檢查快捷鍵狀態
-        self.check_hotkey_state()
 
     def get_text(self, key):
         """獲取當前語言的文字"""
         return LANGUAGES[self.current_language].get(key, LANGUAGES['en_US'][key])
 
     def register_hotkey(self):
-        """註冊全域快捷鍵"""
-        if os.name == 'nt':
-            # 先取消註冊現有的快捷鍵
-            self.unregister_hotkey()
-            
-            # 定義快捷鍵 ID
-            self.hotkey_id = 1
-            
-            # 獲取修飾鍵的值
-            modifier_values = {
-                "Ctrl": 0x0002,
-                "Alt": 0x0001,
-                "Shift": 0x0004
-            }
-            modifier = modifier_values.get(self.hotkey_modifier, 0x0002)
-            
-            # 獲取按鍵的值
-            if self.hotkey_key.isdigit():
-                # 如果是數字鍵 (0-9)
-                key = ord(self.hotkey_key)
-            else:
-                # 如果是字母鍵 (A-Z)
-                key = ord(self.hotkey_key)
-            
-            # 註冊新的快捷鍵
-            if not ctypes.windll.user32.RegisterHotKey(None, self.hotkey_id, modifier, key):
-                print(f"無法註冊全域快捷鍵 {self.hotkey_modifier}+{self.hotkey_key}")
+        """註冊全域快捷鍵（重新開始背景監聽）"""
+        self.hotkey_listener.start(self.hotkey_modifier, self.hotkey_key)
 
     def update_hotkey(self, modifier, key):
         """更新快捷鍵設置"""
@@ -198,48 +179,41 @@ class TagDropWindow(tk.Toplevel):
 
     def unregister_hotkey(self):
         """取消註冊全域快捷鍵"""
-        if os.name == 'nt':
-            ctypes.windll.user32.UnregisterHotKey(None, self.hotkey_id)
-            
-    def check_hotkey_state(self):
-        """檢查快捷鍵狀態"""
-        if os.name == 'nt':
+        self.hotkey_listener.stop()
+
+    def notify_hotkey_event(self):
+        """由監聽執行緒呼叫，以虛擬事件通知主線程處理佇列中的快捷鍵事件"""
+        try:
+            self.event_generate('<<HotkeyEvent>>', when='tail')
+        except (tk.TclError, RuntimeError):
+            # 視窗已關閉或主迴圈尚未開始，事件留在佇列中
+            pass
+
+    def process_hotkey_events(self, event=None):
+        """按下快捷鍵時顯示視窗，放開時隱藏"""
+        while True:
             try:
-                # 獲取修飾鍵的虛擬鍵碼
-                modifier_vk = {
-                    "Ctrl": 0x11,  # VK_CONTROL
-                    "Alt": 0x12,   # VK_MENU
-                    "Shift": 0x10  # VK_SHIFT
-                }.get(self.hotkey_modifier)
-                
-                # 獲取按鍵的虛擬鍵碼
-                if self.hotkey_key.isdigit():
-                    key_vk = ord(self.hotkey_key)
-                else:
-                    key_vk = ord(self.hotkey_key)
-                
-                # 檢查修飾鍵狀態
-                modifier_state = ctypes.windll.user32.GetAsyncKeyState(modifier_vk)
-                # 檢查按鍵狀態
-                key_state = ctypes.windll.user32.GetAsyncKeyState(key_vk)
-                
-                # 如果兩個鍵都被按下
-                if (modifier_state & 0x8000) and (key_state & 0x8000):
-                    if not self.winfo_viewable():
-                        self.show_window()
-                else:
-                    # 檢查是否有子視窗（訊息框）
-                    has_message_box = any(isinstance(child, CustomMessageBox) for child in self.winfo_children())
-                    
-                    # 只有在沒有訊息框顯示時才隱藏視窗
-                    if self.winfo_viewable() and not has_message_box:
-                        self.withdraw()
-                        
-            except Exception as e:
-                print(f"檢查快捷鍵狀態時出錯: {e}")
-                
-        # 每 50ms 檢查一次
-        self.after(50, self.check_hotkey_state)
+                hotkey_event = self.hotkey_events.get_nowait()
+            except queue.Empty:
+                break
+            self.hotkey_held = hotkey_event == 'show'
+        if self.hotkey_held:
+            if not self.winfo_viewable():
+                self.show_window()
+        elif not self.hide_pending:
+            self.hide_window()
+
+    def hide_window(self):
+        """隱藏視窗，有訊息框顯示時等訊息框關閉後再隱藏"""
+        self.hide_pending = False
+        if self.hotkey_held or not self.winfo_viewable():
+            return
+        # 檢查是否有子視窗（訊息框）
+        if any(isinstance(child, CustomMessageBox) for child in self.winfo_children()):
+            self.hide_pending = True
+            self.after(200, self.hide_window)
+            return
+        self.withdraw()
         
     def show_window(self):
         """顯示視窗"""
@@ -255,16 +229,12 @@ class TagDropWindow(tk.Toplevel):
     def on_drop_enter(self, event):
         """當拖曳進入項目時的處理"""
         # 設置高亮樣式
-        self.tag_tree.tag_configure('highlight', background='#E1F5FE')
+        self.tag_sync.configure_style('highlight', background='#E1F5FE')
 
     def on_drop_leave(self, event):
         """當拖曳離開項目時的處理"""
-        # 清除所有項目的高亮效果
-        for item in self.tag_tree.get_children():
-            current_tags = list(self.tag_tree.item(item)['tags'] or ())
-            if 'highlight' in current_tags:
-                current_tags.remove('highlight')
-            self.tag_tree.item(item, tags=current_tags)
+        # 只清除目前高亮項目的效果，保留顏色樣式
+        self.set_highlighted_tag(None)
 
     def on_drop(self, event):
         """處理檔案拖放事件"""
@@ -344,9 +314,7 @@ class TagDropWindow(tk.Toplevel):
             if self.on_drop_callback:
                 self.on_drop_callback(files, target_tag)
                 
-                # 更新標籤列表（確保與主視窗同步）
-                self.update_tags(self.parent.file_manager.get_all_used_tags())
-                # 更新主視窗的標籤列表
+                # 更新主視窗的標籤列表（同時更新此視窗的標籤列表）
                 self.parent.refresh_tag_list()
 
     def destroy(self):
@@ -403,7 +371,7 @@ class TagDropWindow(tk.Toplevel):
             self.screen_right = self.winfo_screenwidth()
             self.screen_bottom = self.winfo_screenheight()
         
-    def create_tag_list(self, tag_list):
+    def create_tag_list(self):
         """創建標籤列表"""
         # 創建框架包含列表和滾動條
         list_frame = tb.Frame(self.main_frame)
@@ -425,28 +393,10 @@ class TagDropWindow(tk.Toplevel):
         # 配置滾動條
         scrollbar.config(command=self.tag_tree.yview)
         
-        # 將標籤分為兩組：有顏色的和沒有顏色的
-        colored_tags = []
-        normal_tags = []
-        for tag in tag_list:
-            if self.file_manager.get_tag_color(tag) != self.file_manager.default_color:
-                colored_tags.append(tag)
-            else:
-                normal_tags.append(tag)
-        
-        # 對有顏色的標籤按修改時間排序（最新的在前）
-        colored_tags.sort(key=lambda tag: self.file_manager.get_tag_color_timestamp(tag), reverse=True)
-        
-        # 先插入有顏色的標籤，再插入普通標籤
-        for tag in colored_tags + normal_tags:
-            color = self.file_manager.get_tag_color(tag)
-            item = self.tag_tree.insert('', tk.END, text=tag)
-            # 為每個標籤創建唯一的標籤樣式
-            tag_style = f'tag_{hash(tag)}'
-            # 只有當顏色不是預設顏色時才設置標籤樣式
-            if color != self.file_manager.default_color:
-                self.tag_tree.tag_configure(tag_style, foreground=color)
-                self.tag_tree.item(item, tags=(tag_style,))
+        # 以標籤名稱對應列表項目，更新時只套用差異
+        self.tag_sync = TreeReconciler(self.tag_tree)
+        self.highlighted_tag = None  # 拖曳時高亮的標籤
+        self.update_tags()
             
         # 設置拖放目標
         self.tag_tree.drop_target_register(DND_FILES)
@@ -457,48 +407,34 @@ class TagDropWindow(tk.Toplevel):
 
     def on_drop_motion(self, event):
         """當拖曳移動時的處理"""
-        # 清除所有項目的高亮效果
-        for item in self.tag_tree.get_children():
-            self.tag_tree.item(item, tags=())
-            
         # 獲取當前滑鼠位置下的項目
         y = event.widget.winfo_pointery() - event.widget.winfo_rooty()
         target_item = self.tag_tree.identify_row(y)
-        
-        if target_item:
-            # 獲取該項目原有的標籤樣式（如果有的話）
-            current_tags = list(self.tag_tree.item(target_item)['tags'] or ())
-            if 'highlight' not in current_tags:
-                current_tags.append('highlight')
-            
-            # 設置高亮效果
-            self.tag_tree.tag_configure('highlight', background='#E1F5FE')
-            self.tag_tree.item(target_item, tags=current_tags)
+        self.set_highlighted_tag(self.tag_sync.key_of(target_item) if target_item else None)
 
-    def update_tags(self, tag_list):
-        """更新標籤列表"""
-        # 清空現有項目
-        self.tag_tree.delete(*self.tag_tree.get_children())
-        
-        # 將標籤分為兩組：有顏色的和沒有顏色的
-        colored_tags = []
-        normal_tags = []
-        for tag in tag_list:
-            if self.file_manager.get_tag_color(tag) != self.file_manager.default_color:
-                colored_tags.append(tag)
+    def set_highlighted_tag(self, tag):
+        """移動拖曳的高亮效果，滑鼠移到另一列時只更新前後兩個項目"""
+        if tag == self.highlighted_tag:
+            return
+        if self.highlighted_tag is not None:
+            self.tag_sync.mark(self.highlighted_tag)
+        if tag is not None:
+            self.tag_sync.configure_style('highlight', background='#E1F5FE')
+            self.tag_sync.mark(tag, ('highlight',))
+        self.highlighted_tag = tag
+
+    def update_tags(self):
+        """依檔案管理器快取的標籤顯示順序更新標籤列表，只套用有變化的標籤"""
+        rows = []
+        for tag, color in self.file_manager.get_tag_view():
+            if color is None:
+                rows.append((tag, {'text': tag, 'tags': ()}))
             else:
-                normal_tags.append(tag)
-        
-        # 對有顏色的標籤按修改時間排序（最新的在前）
-        colored_tags.sort(key=lambda tag: self.file_manager.get_tag_color_timestamp(tag), reverse=True)
-        
-        # 先插入有顏色的標籤，再插入普通標籤
-        for tag in colored_tags + normal_tags:
-            color = self.file_manager.get_tag_color(tag)
-            item = self.tag_tree.insert('', tk.END, text=tag)
-            # 為每個標籤創建唯一的標籤樣式
-            tag_style = f'tag_{hash(tag)}'
-            # 只有當顏色不是預設顏色時才設置標籤樣式
-            if color != self.file_manager.default_color:
-                self.tag_tree.tag_configure(tag_style, foreground=color)
-                self.tag_tree.item(item, tags=(tag_style,)) 
\ No newline at end of file
+                # 為每個標籤創建唯一的標籤樣式
+                tag_style = f'tag_{hash(tag)}'
+                self.tag_sync.configure_style(tag_style, foreground=color)
+                rows.append((tag, {'text': tag, 'tags': (tag_style,)}))
+        self.tag_sync.sync(rows)
+        # 高亮的標籤已被移除時，其標記隨項目一併刪除，之後回到同一列時需重新高亮
+        if self.highlighted_tag is not None and self.highlighted_tag not in self.tag_sync:
+            self.highlighted_tag = None
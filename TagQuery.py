@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""標籤查詢語言
+
+語法範例：
+    (raw OR edited) AND client-x NOT archived
+    travel ext:jpg name:"IMG_2024"
+
+- 相鄰的條件視為 AND，NOT 可直接接在條件之後（a NOT b 即 a AND NOT b）
+- AND / OR / NOT 須為大寫；含空白或關鍵字的標籤以雙引號括住
+- ext: 篩選副檔名，name: 篩選檔名（不分大小寫的部分比對），tag: 明確指定標籤
+"""
+
+import re
+
+from TagIndex import GRAM_SIZE
+
+KEYWORDS = ('AND', 'OR', 'NOT')
+PREFIXES = ('tag', 'ext', 'name')
+
+_TOKEN_PATTERN = re.compile(r'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|([^\s()"]+))')
+_KEYWORD_HINT = re.compile(r'(?:^|[\s(])(?:AND|OR|NOT)(?=$|[\s)])')
+_PREFIX_HINT = re.compile(r'(?:^|[\s(])(?:tag|ext|name):', re.IGNORECASE)
+
+
+class QuerySyntaxError(ValueError):
+    """查詢語法錯誤"""
+
+
+def is_query(text):
+    """判斷搜尋文字是否使用查詢語法（含大寫關鍵字或條件前綴），否則視為一般的檔名搜尋
+
+    只有括號或引號不算，避免 "photo (1)" 之類的檔名搜尋被當成查詢。
+    """
+    return bool(_KEYWORD_HINT.search(text) or _PREFIX_HINT.search(text))
+
+
+def _tokenize(text):
+    """將查詢文字切成 ('(' | ')' | 'AND' | 'OR' | 'NOT' | 'TERM', 值) 的列表"""
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _TOKEN_PATTERN.match(text, position)
+        if match is None:
+            raise QuerySyntaxError(f"無法解析的查詢: {text[position:]}")
+        position = match.end()
+        open_paren, close_paren, quoted, word = match.groups()
+        if open_paren:
+            tokens.append(('(', None))
+        elif close_paren:
+            tokens.append((')', None))
+        elif quoted is not None:
+            value = re.sub(r'\\(.)', r'\1', quoted)
+            # name:"..." 形式：前綴與引號內容合併為一個條件
+            if tokens and tokens[-1][0] == 'PREFIX':
+                tokens[-1] = ('TERM', (tokens[-1][1], value))
+            else:
+                tokens.append(('TERM', ('tag', value)))
+        elif word in KEYWORDS:
+            tokens.append((word, None))
+        else:
+            prefix, colon, value = word.partition(':')
+            if colon and prefix.lower() in PREFIXES:
+                if value:
+                    tokens.append(('TERM', (prefix.lower(), value)))
+                else:
+                    tokens.append(('PREFIX', prefix.lower()))
+            else:
+                tokens.append(('TERM', ('tag', word)))
+    for kind, value in tokens:
+        if kind == 'PREFIX':
+            raise QuerySyntaxError(f"{value}: 後缺少條件")
+    return tokens
+
+
+def _make_term(prefix, value):
+    """建立查詢條件節點，副檔名與檔名統一為小寫"""
+    if prefix == 'ext':
+        value = value.lower()
+        if not value.startswith('.'):
+            value = '.' + value
+    elif prefix == 'name':
+        value = value.lower()
+    return (prefix, value)
+
+
+class _Parser:
+    """遞迴下降解析器，產生 ('and', [...]) / ('or', [...]) / ('not', 節點) / (前綴, 值) 節點"""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position][0]
+        return None
+
+    def take(self):
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def parse(self):
+        if not self.tokens:
+            raise QuerySyntaxError("查詢為空")
+        node = self.parse_or()
+        if self.peek() is not None:
+            raise QuerySyntaxError("多餘的右括號")
+        return node
+
+    def parse_or(self):
+        children = [self.parse_and()]
+        while self.peek() == 'OR':
+            self.take()
+            children.append(self.parse_and())
+        return children[0] if len(children) == 1 else ('or', children)
+
+    def parse_and(self):
+        children = [self.parse_not()]
+        while self.peek() in ('AND', 'NOT', 'TERM', '('):
+            if self.peek() == 'AND':
+                self.take()
+            children.append(self.parse_not())
+        return children[0] if len(children) == 1 else ('and', children)
+
+    def parse_not(self):
+        if self.peek() == 'NOT':
+            self.take()
+            return ('not', self.parse_not())
+        return self.parse_primary()
+
+    def parse_primary(self):
+        kind = self.peek()
+        if kind == '(':
+            self.take()
+            node = self.parse_or()
+            if self.peek() != ')':
+                raise QuerySyntaxError("缺少右括號")
+            self.take()
+            return node
+        if kind == 'TERM':
+            prefix, value = self.take()[1]
+            return _make_term(prefix, value)
+        raise QuerySyntaxError("缺少查詢條件")
+
+
+def parse_query(text):
+    """解析查詢文字，返回查詢節點"""
+    return _Parser(_tokenize(text)).parse()
+
+
+class QueryPlanner:
+    """在標籤索引上執行查詢
+
+    AND 節點先以預估大小由小到大計算標籤、副檔名與檔名片段索引的交集，
+    無法由索引查詢的條件只在交集後的候選檔案上篩選，最後再減去 NOT 條件。
+    """
+
+    def __init__(self, tag_index):
+        self.index = tag_index
+        self._universe = None
+
+    def universe(self):
+        """所有檔案 ID"""
+        if self._universe is None:
+            self._universe = self.index.all_ids()
+        return self._universe
+
+    def estimate(self, node):
+        """預估節點結果的檔案數"""
+        kind = node[0]
+        if kind == 'tag':
+            return len(self.index.lookup(node[1]))
+        if self._is_indexed(node):
+            if kind == 'ext':
+                return len(self.index.lookup_extension(node[1]))
+            return self.index.estimate_name(node[1])
+        if kind == 'and':
+            estimates = [self.estimate(child) for child in node[1] if not self._is_filter(child)]
+            return min(estimates) if estimates else len(self.index)
+        if kind == 'or':
+            return sum(self.estimate(child) for child in node[1])
+        return len(self.index)
+
+    @staticmethod
+    def _is_indexed(node):
+        """可由索引查詢的副檔名或檔名條件
+
+        .tar.gz 之類的多段副檔名以路徑結尾比對，短於一個片段的檔名直接比對檔名。
+        """
+        kind = node[0]
+        if kind == 'ext':
+            return node[1].count('.') == 1
+        if kind == 'name':
+            return len(node[1]) >= GRAM_SIZE
+        return False
+
+    @classmethod
+    def _is_filter(cls, node):
+        """不需索引、可直接套用在候選檔案上的條件"""
+        if node[0] in ('ext', 'name'):
+            return not cls._is_indexed(node)
+        return node[0] == 'not'
+
+    def _filter(self, ids, node):
+        """以副檔名或檔名條件篩選候選檔案"""
+        kind, value = node
+        if kind == 'ext':
+            paths = self.index.paths
+            matched = (path_id for path_id in ids if paths[path_id].lower().endswith(value))
+        else:
+            names = self.index.names
+            matched = (path_id for path_id in ids if value in names[path_id])
+        return self.index.make_ids(matched)
+
+    def execute(self, node):
+        """執行查詢節點，返回檔案 ID 集合"""
+        kind = node[0]
+        if kind == 'tag':
+            return self.index.lookup(node[1])
+        if kind == 'ext' and self._is_indexed(node):
+            return self.index.lookup_extension(node[1])
+        if kind == 'name':
+            return self.index.search_name(node[1])
+        if kind == 'ext':
+            return self._filter(self.universe(), node)
+        if kind == 'not':
+            return self.universe() - self.execute(node[1])
+        if kind == 'or':
+            results = [self.execute(child) for child in node[1]]
+            result = results[0]
+            for ids in results[1:]:
+                result = result | ids
+            return result
+
+        # AND：先計算最小的索引集合，再套用篩選條件與 NOT 條件
+        children = node[1]
+        positives = sorted((child for child in children if not self._is_filter(child)), key=self.estimate)
+        result = None
+        for child in positives:
+            if child[0] == 'name' and result is not None and len(result) <= self.estimate(child):
+                # 候選檔案已比檔名片段少時，直接比對候選檔案的檔名
+                result = self._filter(result, child)
+            else:
+                ids = self.execute(child)
+                result = ids if result is None else result & ids
+            if not result:
+                return self.index.make_ids(())
+        if result is None:
+            result = self.universe()
+        for child in children:
+            if child[0] in ('ext', 'name') and self._is_filter(child):
+                result = self._filter(result, child)
+        for child in children:
+            if child[0] != 'not':
+                continue
+            excluded = child[1]
+            if excluded[0] == 'name' or (excluded[0] == 'ext' and self._is_filter(excluded)):
+                # 排除條件同樣只在候選檔案上篩選
+                result = result - self._filter(result, excluded)
+            else:
+                result = result - self.execute(excluded)
+        return result
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+class TreeReconciler:
+    """以鍵值對應 Treeview 的項目，更新時只套用差異
+
+    sync() 依新的鍵值順序刪除消失的項目、插入新項目、移動順序改變的項目，
+    只對文字、值或樣式改變的項目呼叫 item()，樣式設定也只在改變時重新套用。
+    保留下來的項目 ID 不變，選取狀態因此不需重新恢復。
+    """
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.items = {}    # 鍵 -> 項目 ID
+        self.keys = {}     # 項目 ID -> 鍵
+        self.order = []    # 目前顯示的鍵值順序
+        self.options = {}  # 鍵 -> 已套用的項目選項
+        self.marks = {}    # 鍵 -> 額外附加的樣式（例如拖曳時的高亮）
+        self.styles = {}   # 樣式名稱 -> 已設定的選項
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def item_id(self, key):
+        """取得鍵值對應的項目 ID，不存在時返回 None"""
+        return self.items.get(key)
+
+    def key_of(self, item):
+        """取得項目 ID 對應的鍵值，不存在時返回 None"""
+        return self.keys.get(item)
+
+    def configure_style(self, style, **options):
+        """設定樣式，選項與上次相同時不重新設定"""
+        if self.styles.get(style) != options:
+            self.tree.tag_configure(style, **options)
+            self.styles[style] = options
+
+    def _item_options(self, key, options):
+        mark = self.marks.get(key)
+        if mark:
+            options = dict(options)
+            options['tags'] = tuple(options.get('tags', ())) + mark
+        return options
+
+    def sync(self, rows):
+        """依 rows 更新 Treeview
+
+        rows 為依顯示順序排列的 (鍵, 選項) 列表，選項為 Treeview.item 的參數（text、values、tags）。
+        """
+        rows = list(rows)
+        new_keys = {key for key, _ in rows}
+
+        removed = [key for key in self.order if key not in new_keys]
+        if removed:
+            self.tree.delete(*[self.items[key] for key in removed])
+            for key in removed:
+                del self.keys[self.items.pop(key)]
+                del self.options[key]
+                self.marks.pop(key, None)
+            current = [key for key in self.order if key in new_keys]
+        else:
+            current = self.order
+
+        # 由前往後確保第 index 個位置為正確的項目，之前的位置都已正確，
+        # 因此插入或移動到 index 時不受項目原本位置影響
+        for index, (key, options) in enumerate(rows):
+            item = self.items.get(key)
+            if item is None:
+                position = 'end' if index >= len(current) else index
+                item = self.tree.insert('', position, **self._item_options(key, options))
+                self.items[key] = item
+                self.keys[item] = key
+                self.options[key] = options
+                current.insert(index, key)
+                continue
+            if current[index] != key:
+                self.tree.move(item, '', index)
+                current.remove(key)
+                current.insert(index, key)
+            if self.options[key] != options:
+                self.tree.item(item, **self._item_options(key, options))
+                self.options[key] = options
+        self.order = current
+
+    def mark(self, key, styles=()):
+        """為單一項目附加或移除額外的樣式，只更新該項目"""
+        if key not in self.items or self.marks.get(key, ()) == tuple(styles):
+            return
+        if styles:
+            self.marks[key] = tuple(styles)
+        else:
+            self.marks.pop(key, None)
+        self.tree.item(self.items[key], tags=self._item_options(key, self.options[key]).get('tags', ()))
+
+    def clear(self):
+        """移除所有項目"""
+        if self.items:
+            self.tree.delete(*self.items.values())
+        self.items = {}
+        self.keys = {}
+        self.order = []
+        self.options = {}
+        self.marks = {}
@@ -0,0 +1,302 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+from collections import OrderedDict
+
+from TreeSync import TreeReconciler
+
+# 每次向查詢結果取出的檔案數
+CHUNK_SIZE = 256
+# 最多保留的區塊數，記憶體用量不隨結果大小增加
+MAX_CHUNKS = 8
+# 尚未取得實際列高前使用的預設值（像素）
+DEFAULT_ROW_HEIGHT = 30
+# 滑鼠滾輪每格捲動的列數
+WHEEL_ROWS = 3
+
+# 事件的修飾鍵狀態
+SHIFT_MASK = 0x0001
+CONTROL_MASK = 0x0004
+
+
+class PathList:
+    """以路徑列表提供與查詢結果相同的介面（count、page、in）"""
+
+    def __init__(self, paths=()):
+        self.paths = list(paths)
+        self._path_set = None
+
+    def count(self):
+        return len(self.paths)
+
+    def page(self, offset, limit):
+        return self.paths[offset:offset + limit]
+
+    def __contains__(self, path):
+        if self._path_set is None:
+            self._path_set = set(self.paths)
+        return path in self._path_set
+
+
+class VirtualFileList:
+    """只顯示可見範圍的檔案列表
+
+    Treeview 只保留填滿視窗所需的列，捲動時把捲軸位置換算成結果中的位置，
+    再向查詢結果分區塊取出該範圍的檔案，只插入或刪除進出可見範圍的列。
+    選取狀態以檔案路徑保存，捲出可見範圍的檔案仍維持選取。
+
+    檔案來源需提供 count()、page(offset, limit) 與 in 判斷，
+    若提供 after(cursor, limit)，向下捲動時以上一區塊的最後一個路徑接續取出。
+
+    選取的檔案改變時產生一次 <<FileListSelect>>，應用程式應綁定此事件：
+    捲動時為可見範圍重設 Treeview 的選取也會觸發 <<TreeviewSelect>>，不代表選取改變。
+    count_callback 在檔案來源改變時以結果的檔案數呼叫（例如更新檔案數的顯示）。
+    """
+
+    SELECT_EVENT = '<<FileListSelect>>'  # 選取的檔案改變時產生的虛擬事件
+
+    def __init__(self, tree, scrollbar, count_callback=None):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.count_callback = count_callback
+        self.source = PathList()
+        self.total = 0
+        self.offset = 0            # 第一個可見列在結果中的位置
+        self.sync = TreeReconciler(tree)  # 檔案路徑 -> Treeview 項目
+        self.rows = []             # 顯示中的 Treeview 項目 ID
+        self.row_paths = []        # 顯示中的檔案路徑
+        self.row_height = DEFAULT_ROW_HEIGHT
+        self.chunks = OrderedDict()  # 區塊編號 -> 檔案路徑列表
+        self.selected = set()      # 選取的檔案路徑
+        self.anchor = None         # Shift 範圍選取的起點位置
+        self.cursor = None         # 鍵盤操作的目前位置
+        self._refresh_pending = False
+
+        scrollbar.config(command=self.yview)
+        tree.bind('<Configure>', lambda event: self.schedule_refresh(), add='+')
+        tree.bind('<MouseWheel>', self._on_mousewheel)
+        tree.bind('<Button-4>', self._on_mousewheel)
+        tree.bind('<Button-5>', self._on_mousewheel)
+        tree.bind('<Button-1>', self._on_click)
+        tree.bind('<Up>', lambda event: self._on_key(event, -1))
+        tree.bind('<Down>', lambda event: self._on_key(event, 1))
+        tree.bind('<Prior>', lambda event: self._on_key(event, -self.visible_rows()))
+        tree.bind('<Next>', lambda event: self._on_key(event, self.visible_rows()))
+        tree.bind('<Home>', lambda event: self._on_key(event, -self.total))
+        tree.bind('<End>', lambda event: self._on_key(event, self.total))
+
+    # ---- 檔案來源 ----
+
+    def set_source(self, source, keep_position=False):
+        """顯示新的檔案來源，keep_position 為 True 時維持目前捲動位置"""
+        self.source = source
+        self.total = source.count()
+        self.chunks.clear()
+        # 只保留仍在新結果中的選取檔案
+        previous = self.selected
+        self.selected = {path for path in previous if path in source}
+        if not keep_position:
+            self.offset = 0
+            self.anchor = None
+            self.cursor = None
+        self.refresh()
+        if self.count_callback is not None:
+            self.count_callback(self.total)
+        if self.selected != previous:
+            self.tree.event_generate(self.SELECT_EVENT)
+
+    def set_files(self, paths, keep_position=False):
+        """以路徑列表作為檔案來源"""
+        self.set_source(PathList(paths), keep_position)
+
+    def clear(self):
+        """清空列表與選取"""
+        self.set_source(PathList())
+
+    def _fetch(self, offset, count):
+        """取出結果中 offset 起的 count 個檔案路徑"""
+        end = min(offset + count, self.total)
+        if end <= offset:
+            return []
+        if end - offset > CHUNK_SIZE * 2:
+            # 大範圍（例如 Shift 選取）直接向來源取出，不佔用區塊快取
+            return self.source.page(offset, end - offset)
+        paths = []
+        position = offset
+        while position < end:
+            index = position // CHUNK_SIZE
+            chunk = self._chunk(index)
+            start = position - index * CHUNK_SIZE
+            part = chunk[start:start + end - position]
+            if not part:
+                break
+            paths.extend(part)
+            position += len(part)
+        return paths
+
+    def _chunk(self, index):
+        chunk = self.chunks.get(index)
+        if chunk is not None:
+            self.chunks.move_to_end(index)
+            return chunk
+        previous = self.chunks.get(index - 1)
+        if previous is not None and len(previous) == CHUNK_SIZE and hasattr(self.source, 'after'):
+            chunk = self.source.after(previous[-1], CHUNK_SIZE)
+        else:
+            chunk = self.source.page(index * CHUNK_SIZE, CHUNK_SIZE)
+        self.chunks[index] = chunk
+        if len(self.chunks) > MAX_CHUNKS:
+            self.chunks.popitem(last=False)
+        return chunk
+
+    # ---- 顯示 ----
+
+    def visible_rows(self):
+        """視窗可容納的列數"""
+        if self.rows:
+            box = self.tree.bbox(self.rows[0])
+            if box:
+                self.row_height = box[3]
+        return max(1, self.tree.winfo_height() // self.row_height)
+
+    def schedule_refresh(self):
+        """在閒置時重新顯示，連續的捲動事件只重繪一次"""
+        if not self._refresh_pending:
+            self._refresh_pending = True
+            self.tree.after_idle(self.refresh)
+
+    def refresh(self):
+        """依目前位置重新填入可見範圍的檔案"""
+        self._refresh_pending = False
+        visible = self.visible_rows()
+        self.offset = max(0, min(self.offset, self.total - visible))
+        paths = self._fetch(self.offset, visible)
+
+        self.sync.sync((path, {'text': os.path.basename(path), 'values': (path,)}) for path in paths)
+        self.rows = [self.sync.item_id(path) for path in paths]
+        self.row_paths = paths
+
+        self.tree.yview_moveto(0)
+        self._show_selection()
+        self._update_scrollbar(visible)
+
+        # 第一次顯示後才取得實際列高，列數不同時重新填入
+        if paths and self.visible_rows() != visible:
+            self.schedule_refresh()
+
+    def _show_selection(self):
+        items = tuple(item for item, path in zip(self.rows, self.row_paths) if path in self.selected)
+        if items != self.tree.selection():
+            self.tree.selection_set(items)
+        if self.cursor is not None and 0 <= self.cursor - self.offset < len(self.rows):
+            self.tree.focus(self.rows[self.cursor - self.offset])
+
+    def _update_scrollbar(self, visible):
+        if not self.total:
+            self.scrollbar.set(0, 1)
+            return
+        self.scrollbar.set(self.offset / self.total, min(1.0, (self.offset + visible) / self.total))
+
+    # ---- 捲動 ----
+
+    def scroll_to(self, offset):
+        """捲動到結果中的位置"""
+        self.offset = max(0, min(offset, self.total - 1))
+        self.schedule_refresh()
+
+    def see(self, position):
+        """捲動使結果中的位置可見"""
+        visible = self.visible_rows()
+        if position < self.offset:
+            self.scroll_to(position)
+        elif position >= self.offset + visible:
+            self.scroll_to(position - visible + 1)
+
+    def yview(self, *args):
+        """捲軸的 command，依拖曳或點擊捲動"""
+        if not args:
+            return
+        if args[0] == 'moveto':
+            self.scroll_to(int(float(args[1]) * self.total))
+        elif args[0] == 'scroll':
+            amount = int(args[1])
+            if args[2] == 'pages':
+                amount *= self.visible_rows()
+            self.scroll_to(self.offset + amount)
+
+    def _on_mousewheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.scroll_to(self.offset - WHEEL_ROWS)
+        else:
+            self.scroll_to(self.offset + WHEEL_ROWS)
+        return 'break'
+
+    # ---- 選取 ----
+
+    def selected_paths(self):
+        """返回所有選取的檔案路徑（包含不在可見範圍的檔案），依路徑排序"""
+        return sorted(self.selected)
+
+    def is_selected(self, path):
+        return path in self.selected
+
+    def select_paths(self, paths):
+        """以指定的檔案取代目前的選取"""
+        previous = self.selected
+        self.selected = set(paths)
+        self._selection_changed(previous)
+
+    def _selection_changed(self, previous):
+        """顯示新的選取，與 previous 不同時通知應用程式"""
+        self._show_selection()
+        if self.selected != previous:
+            self.tree.event_generate(self.SELECT_EVENT)
+
+    def _on_click(self, event):
+        self.tree.focus_set()
+        item = self.tree.identify_row(event.y)
+        if not item or item not in self.rows:
+            if not event.state & (SHIFT_MASK | CONTROL_MASK):
+                self.select_paths(())
+            return 'break'
+        position = self.offset + self.rows.index(item)
+        path = self.row_paths[position - self.offset]
+        previous = self.selected
+        if event.state & SHIFT_MASK and self.anchor is not None:
+            start, end = sorted((self.anchor, position))
+            self.selected = set(previous) if event.state & CONTROL_MASK else set()
+            self.selected.update(self._fetch(start, end - start + 1))
+        elif event.state & CONTROL_MASK:
+            self.selected = set(previous)
+            if path in self.selected:
+                self.selected.discard(path)
+            else:
+                self.selected.add(path)
+            self.anchor = position
+        else:
+            self.selected = {path}
+            self.anchor = position
+        self.cursor = position
+        self._selection_changed(previous)
+        return 'break'
+
+    def _on_key(self, event, delta):
+        if not self.total:
+            return 'break'
+        if self.cursor is None:
+            position = self.offset if delta > 0 else self.offset + len(self.rows) - 1
+        else:
+            position = self.cursor + delta
+        position = max(0, min(position, self.total - 1))
+        previous = self.selected
+        if event.state & SHIFT_MASK and self.anchor is not None:
+            start, end = sorted((self.anchor, position))
+            self.selected = set(self._fetch(start, end - start + 1))
+        else:
+            self.selected = set(self._fetch(position, 1))
+            self.anchor = position
+        self.cursor = position
+        self.see(position)
+        self._selection_changed(previous)
+        return 'break'
@@ -121,7 +121,6 @@ LANGUAGES = {
         "delete_tag_window": "刪除標籤",
         "refreshing_files": "正在刷新檔案，請稍候...",
         "save_failed": "儲存失敗",
-        "file_limit_message": "僅顯示前1000個檔案",
         "total_files": "個檔案",
         "folders_updated": "資料夾設定已更新",
         "drop_on_tag": "請將檔案拖放到指定的標籤上",
@@ -342,7 +341,6 @@ LANGUAGES = {
         "delete_tag_window": "删除标签",
         "refreshing_files": "正在刷新文件，请稍候...",
         "save_failed": "保存失败",
-        "file_limit_message": "仅显示前1000个文件",
         "total_files": "个文件",
         "folders_updated": "文件夹设置已更新",
         "drop_on_tag": "请将文件拖放到指定的标签上",
@@ -564,7 +562,6 @@ File Tag Management System User Guide:
         "current_tag": "Current Tag",
         "refreshing_files": "Refreshing files, please wait...",
         "save_failed": "Save failed",
-        "file_limit_message": "Showing first 1000 files only",
         "total_files": "total files",
         "folders_updated": "Folder settings updated",
         "drop_on_tag": "Please drop files on a specific tag",
@@ -786,7 +783,6 @@ File Tag Management System User Guide:
         "current_tag": "現在のタグ",
         "refreshing_files": "ファイルを更新中、お待ちください...",
         "save_failed": "保存に失敗しました",
-        "file_limit_message": "最初の1000ファイルのみ表示",
         "total_files": "ファイル合計",
         "folders_updated": "フォルダ設定が更新されました",
         "drop_on_tag": "ファイルを指定されたタグにドラッグしてください",